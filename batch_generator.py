@@ -0,0 +1,122 @@
+"""
+Generate many puzzles of one sampler, one puzzle per seed, in parallel generator processes:
+
+    python3 batch_generator.py GridWorldSampler config.json --seeds 0:10000 --output puzzles/grid_world
+
+config.json contains the "world_config" and the "sampler_config" (like puzzle_generator.py) and optionally the
+"world" ("UrdfWorld" by default or "BlenderWorld", which runs every generator in a headless Blender process).
+Every puzzle is built in a staging directory and moved into the output directory when it is complete. Finished seeds
+are appended to manifest.jsonl in the output directory, so running the same command again after an interruption only
+builds the seeds that are still missing. Generator processes are replaced after --recycle-after builds and restarted
+when they crash, so a long batch does not depend on one Blender process surviving. With "purge_orphans": true in the
+world config, every generator frees all data of a puzzle after building it, and --max-rss recycles generators whose
+memory grows anyway.
+"""
+import os
+import sys
+import json
+import argparse
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(DIR)
+from src.pipeline import Pipeline
+
+MANIFEST = "manifest.jsonl"
+
+
+def seed_range(text):
+    """Parse "start:stop" (like range()) or a single seed."""
+    if ":" in text:
+        start, stop = text.split(":")
+        return range(int(start), int(stop))
+    return range(int(text), int(text) + 1)
+
+
+def read_manifest(filepath):
+    """Return the header and the finished entries of a manifest (a truncated last line is ignored)."""
+    header, entries = None, {}
+    if not os.path.exists(filepath):
+        return header, entries
+    with open(filepath, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "seed" in entry:
+                entries[entry["seed"]] = entry
+            else:
+                header = entry
+    return header, entries
+
+
+def _ends_with_newline(filepath):
+    with open(filepath, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate puzzles of one sampler for a range of seeds.")
+    parser.add_argument("sampler", help="name of a sampler class in src/sampling.py, e.g. GridWorldSampler")
+    parser.add_argument("config", help="JSON file with world_config, sampler_config and optionally world")
+    parser.add_argument("--seeds", type=seed_range, default=range(100), help="start:stop (default 0:100)")
+    parser.add_argument("--output", default="puzzles/batch", help="output directory (default puzzles/batch)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="generator processes")
+    parser.add_argument("--recycle-after", type=int, default=200, help="builds per generator process (0: never)")
+    parser.add_argument("--max-rss", type=int, default=0,
+                        help="replace a generator process when it uses more memory (in MB, 0: never)")
+    parser.add_argument("--verify", action="store_true", help="test the solvability of every puzzle")
+    parser.add_argument("--planning-time", type=float, default=5., help="allowed planning time for --verify")
+    parser.add_argument("--blender", default="blender", help="Blender executable for BlenderWorld")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    world = config.get("world", "UrdfWorld")
+    header = {"sampler": args.sampler, "world": world, "world_config": config["world_config"],
+              "sampler_config": config["sampler_config"]}
+
+    os.makedirs(args.output, exist_ok=True)
+    manifest_path = os.path.join(args.output, MANIFEST)
+    manifest_header, finished = read_manifest(manifest_path)
+    if manifest_header is not None and manifest_header != header:
+        print("the manifest " + manifest_path + " belongs to another sampler or config, choose another output")
+        return 1
+    seeds = [seed for seed in args.seeds if seed not in finished]
+    print(len(args.seeds) - len(seeds), "of", len(args.seeds), "seeds are already finished")
+    if not seeds:
+        return 0
+
+    world_config = dict(config["world_config"])
+    world_config["dir_for_output"] = os.path.abspath(os.path.join(args.output, ".staging"))
+    world_config["absolute_path_for_meshes_in_urdf"] = False  # the puzzles are moved after they are built
+
+    with open(manifest_path, 'a') as manifest:
+        if manifest.tell() and not _ends_with_newline(manifest_path):
+            manifest.write("\n")  # terminate the line that an interrupted run left incomplete
+        if manifest_header is None:
+            manifest.write(json.dumps(header) + "\n")
+
+        def record(result):
+            if result.get("crashed"):
+                print("seed", result["seed"], "crashed:", result["error"])  # it is built again in the next run
+                return
+            entry = {key: result[key] for key in ("seed", "name", "returncode", "generation_time", "problem_path",
+                                                  "solved", "error") if key in result}
+            manifest.write(json.dumps(entry) + "\n")
+            manifest.flush()
+
+        pipeline = Pipeline(args.sampler, config["sampler_config"], world_config, world, generators=args.workers,
+                            verify=args.verify, render=False, planning_time=args.planning_time,
+                            blender=args.blender, name_prefix=config["sampler_config"].get("puzzle_name"),
+                            output_directory=args.output,
+                            max_builds_per_generator=args.recycle_after or None,
+                            max_generator_rss=args.max_rss * 2 ** 20 or None, on_result=record)
+        results = pipeline.run(seeds)
+    print(sum(result["returncode"] == 0 for result in results), "of", len(seeds), "puzzles were built")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
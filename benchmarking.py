@@ -7,6 +7,7 @@ from src.world import BlenderWorld
 from src.sampling import *
 from src import pybullet_simulation
 from src import robowflex_simulation
+from src import benchmark
 from src import calc
 
 # output settings and world properties
@@ -60,12 +61,14 @@ world = BlenderWorld(world_config)
 
 BENCHMARK_RUNS = 1
 VERSIONS = 1
+problems = []  # problem files for the benchmark without robowflex (see below)
 
 for i in range(VERSIONS):
     sampler_config["number_prismatic_joints"] = 4
     sampler_config["puzzle_name"] = "simple_sliders_v" + str(i)
     sampler = SimpleSlidersSampler(sampler_config, world)
     sampler.build()
+    problems.append(sampler.save_problem())
     robowflex_simulation.solve(world.urdf_path, planning_time=10., benchmark_runs=BENCHMARK_RUNS)
     # pybullet_simulation.solve(world.urdf_path, sampler.start_state, sampler.goal_space, 10., True)
 
@@ -76,6 +79,7 @@ for i in range(VERSIONS):
     sampler_config["puzzle_name"] = "grid_world_v" + str(i)
     sampler = GridWorldSampler(sampler_config, world)
     sampler.build()
+    problems.append(sampler.save_problem())
     robowflex_simulation.solve(world.urdf_path, planning_time=30., benchmark_runs=BENCHMARK_RUNS)
     # pybullet_simulation.solve(world.urdf_path, sampler.start_state, sampler.goal_space, 10., True)
 
@@ -85,6 +89,7 @@ for i in range(VERSIONS):
     sampler_config["puzzle_name"] = "continuous_space_v" + str(i)
     sampler = ContinuousSpaceSampler(sampler_config, world)
     sampler.build()
+    problems.append(sampler.save_problem())
     robowflex_simulation.solve(world.urdf_path, planning_time=1., benchmark_runs=BENCHMARK_RUNS)
     # pybullet_simulation.solve(world.urdf_path, sampler.start_state, sampler.goal_space, 10., True)
 
@@ -95,20 +100,27 @@ for i in range(VERSIONS):
     sampler_config["puzzle_name"] = "lockbox_random_v" + str(i)
     sampler = LockboxRandomSampler(sampler_config, world)
     sampler.build()
+    problems.append(sampler.save_problem())
     robowflex_simulation.solve(world.urdf_path, planning_time=30., benchmark_runs=BENCHMARK_RUNS)
     # pybullet_simulation.solve(world.urdf_path, sampler.start_state, sampler.goal_space, 10., True)
 
     sampler_config["puzzle_name"] = "escape_room_v" + str(i)
     sampler = EscapeRoomSampler(sampler_config, world)
     sampler.build()
+    problems.append(sampler.save_problem())
     robowflex_simulation.solve(world.urdf_path, planning_time=15., benchmark_runs=BENCHMARK_RUNS)
 
     sampler_config["puzzle_name"] = "move_twice_v" + str(i)
     sampler = MoveTwiceSampler(sampler_config, world)
     sampler.build()
+    problems.append(sampler.save_problem())
     robowflex_simulation.solve(world.urdf_path, planning_time=10., benchmark_runs=BENCHMARK_RUNS)
 
     # sampler_config["puzzle_name"] = "lockbox2017_v" + str(i)
     # sampler = Lockbox2017Sampler(sampler_config, world)
     # sampler.build()
     # robowflex_simulation.solve(world.urdf_path, planning_time=1)
+
+# benchmark all puzzles with the local pybullet/OMPL stack instead (no robowflex workspace needed)
+# benchmark.benchmark(problems, ("RRTConnect", "RRT", "PRM", "EST"), planning_time=10., runs=BENCHMARK_RUNS,
+#                     database_path=world_config["dir_for_output"] + "/benchmark.db")
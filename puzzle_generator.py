@@ -4,6 +4,7 @@ import sys
 DIR = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(DIR)
 from src.world import BlenderWorld
+from src.urdf_world import UrdfWorld
 from src.sampling import *
 from src.pybullet_simulation import solve
 from src import robowflex_simulation
@@ -15,6 +16,10 @@ world_config = {
     "link_shrink": 0.001,                       # reduce the size of every link by this value to avoid touching and
                                                 # permanent collision
     "export_entity_srdf": True,
+    "export_collision_matrix": False,           # add the link pairs that can never collide to the srdf
+    "merge_static_geometry": False,             # replace fixed walls and pillars attached to base_link whose boxes
+                                                # fuse into one box by one link per fused box (same collision
+                                                # verdicts, see compare_state_validity() in pybullet_simulation.py)
     "absolute_path_for_meshes_in_urdf": True,   # generate an absolute path to reference the output meshes from within
                                                 # the urdf if True, else use a relative path
     "export_mesh_dae": False,
@@ -33,7 +38,13 @@ world_config = {
         ((-30, 30, 20), (0.96, 0, -calc.RAD135)),   # southeast
         ((30, 30, 20), (0.96, 0, calc.RAD135)),     # southwest
         ((30, -30, 20), (0.96, 0, calc.RAD45)),     # northwest
-    )
+    ),
+    "parallel_render_workers": 0,               # render the images in this many background Blender processes while
+                                                # the generation goes on (0 renders them one after another)
+    "direct_data_construction": False,          # create fixed links (walls, pillars, ...) by copying a prototype
+                                                # through bpy.data instead of running Phobos operators for each
+    "purge_orphans": False,                     # remove all unused Blender data on every reset (for long-running
+                                                # Blender processes, see batch_generator.py)
 }
 
 sampler_config = {
@@ -66,6 +77,9 @@ sampler_config = {
     "upper_limit_revolute": (calc.RAD90, calc.RAD180),  # same here (but there is a 50 % chance for the joint to be
                                                         # clockwise)
     "attempts_per_link": 50,
+    "parallel_candidates": 1,  # test this many candidates for the next link+joint concurrently (optional)
+    "planner_portfolio": None,  # e.g. ("RRTConnect", "KPIECE1", "BITstar") to race these planners in every test
+                                # instead of only using RRTConnect (optional, not used with parallel_candidates > 1)
 
     # this part is only required for Lockbox2017Sampler and LockboxRandomSampler
     "slot_disc_mesh": {
@@ -109,6 +123,7 @@ sampler_config = {
 
 # set up world according to world_config
 world = BlenderWorld(world_config)
+# world = UrdfWorld(world_config)  # no Blender needed but no meshes and no images (see README)
 
 # sampler_config["number_prismatic_joints"] = 2
 # sampler = SimpleSlidersSampler(sampler_config, world)
@@ -160,3 +175,5 @@ world = BlenderWorld(world_config)
 #     sampler.build()
 # solve(world.urdf_path, sampler.start_state, sampler.goal_space, 60., show_gui=True)
 # # robowflex_simulation.solve(world.urdf_path, 60, animation=True)
+
+world.wait_for_renders()
@@ -0,0 +1,68 @@
+'''
+Solution path certificates: the start state, the goal space and the states of a solution path in a compact binary file.
+
+    8 bytes   b"PZLPATH1"
+    4 bytes   number of dimensions d (unsigned int, little endian)
+    4 bytes   number of path states n (unsigned int, little endian)
+    8 * d     start state (doubles, little endian)
+    16 * d    goal space (lower and upper bound of every dimension)
+    8 * n * d path states
+
+A certificate is verified by replaying the path through the state validity checker (see PbOMPL.check_path()).
+'''
+import os
+import sys
+import struct
+from array import array
+
+MAGIC = b"PZLPATH1"
+HEADER = struct.Struct("<8sII")
+
+
+def _doubles(values):
+    result = array('d', values)
+    if sys.byteorder == 'big':
+        result.byteswap()
+    return result
+
+
+def write_certificate(filepath, start_state, goal_space, path):
+    '''
+    goal_space: list of (lower, upper) tuples or a goal state
+    path: list of states (list of floats)
+    '''
+    dimensions = len(start_state)
+    goal_bounds = []
+    for goal in goal_space:
+        goal_bounds.extend(goal if isinstance(goal, (tuple, list)) else (goal, goal))
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    temporary_path = filepath + "." + str(os.getpid()) + ".tmp"
+    with open(temporary_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, dimensions, len(path)))
+        _doubles(start_state).tofile(f)
+        _doubles(goal_bounds).tofile(f)
+        _doubles(value for state in path for value in state).tofile(f)
+    os.replace(temporary_path, filepath)
+
+
+def read_certificate(filepath):
+    '''
+    Return start state, goal space (list of (lower, upper) tuples) and path of a certificate.
+    Raises ValueError if the file is no certificate.
+    '''
+    with open(filepath, 'rb') as f:
+        content = f.read()
+    if len(content) < HEADER.size:
+        raise ValueError(filepath + " is no path certificate")
+    magic, dimensions, length = HEADER.unpack_from(content)
+    if magic != MAGIC or len(content) != HEADER.size + 8 * dimensions * (3 + length):
+        raise ValueError(filepath + " is no path certificate")
+    values = array('d')
+    values.frombytes(content[HEADER.size:])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    start_state = list(values[:dimensions])
+    goal_space = [(values[dimensions + 2 * i], values[dimensions + 2 * i + 1]) for i in range(dimensions)]
+    offset = 3 * dimensions
+    path = [list(values[offset + i * dimensions:offset + (i + 1) * dimensions]) for i in range(length)]
+    return start_state, goal_space, path
@@ -114,15 +114,27 @@ class PbStateSpace(ob.RealVectorStateSpace):
         self.state_sampler = state_sampler
 
 class PbOMPL():
-    def __init__(self, robot, obstacles = []) -> None:
+    def __init__(self, robot, obstacles = [], collision_mode = "pairwise", never_colliding_pairs = ()) -> None:
         '''
         Args
             robot: A PbOMPLRobot instance.
             obstacles: list of obstacle ids. Optional.
+            collision_mode: "pairwise" queries pybullet once per link pair to check, "batched" runs the collision
+                            detection once per state and filters the contact points (the robot must be loaded with
+                            flags=p.URDF_USE_SELF_COLLISION), "incremental" is like "pairwise" but only queries the
+                            pairs that contain a link moved by a joint that changed since the last check. Optional.
+            never_colliding_pairs: (link name, link name) pairs that are not checked, e.g. the allowed collision
+                                   matrix of src/collision_matrix.py. Optional.
         '''
         self.robot = robot
         self.robot_id = robot.id
         self.obstacles = obstacles
+        self.collision_mode = collision_mode
+        self.disabled_collisions = utils.get_link_indices(robot.id, never_colliding_pairs)
+        self.num_state_checks = 0
+        self.state_check_time = 0.
+        self.pair_cache_hits = 0
+        self.pair_cache_misses = 0
         print(self.obstacles)
 
         self.space = PbStateSpace(robot.num_dim)
@@ -148,7 +160,7 @@ class PbOMPL():
         self.obstacles = obstacles
 
         # update collision detection
-        self.setup_collision_detection(self.robot, self.obstacles)
+        self.setup_collision_detection(self.robot, self.obstacles, disabled_collisions=self.disabled_collisions)
 
     def add_obstacles(self, obstacle_id):
         self.obstacles.append(obstacle_id)
@@ -157,6 +169,18 @@ class PbOMPL():
         self.obstacles.remove(obstacle_id)
 
     def is_state_valid(self, state):
+        begin = time.perf_counter()
+        if self.collision_mode == "batched":
+            valid = self._is_state_valid_batched(state)
+        elif self.collision_mode == "incremental":
+            valid = self._is_state_valid_incremental(state)
+        else:
+            valid = self._is_state_valid_pairwise(state)
+        self.num_state_checks += 1
+        self.state_check_time += time.perf_counter() - begin
+        return valid
+
+    def _is_state_valid_pairwise(self, state):
         # satisfy bounds TODO
         # Should be unecessary if joint bounds is properly set
 
@@ -175,13 +199,104 @@ class PbOMPL():
                 return False
         return True
 
-    def setup_collision_detection(self, robot, obstacles, self_collisions = True, allow_collision_links = []):
-        self.check_link_pairs = utils.get_self_link_pairs(robot.id, robot.joint_idx) if self_collisions else []
+    def _is_state_valid_batched(self, state):
+        '''
+        One collision detection for the whole world finds the candidate pairs instead of one query per pair. Only
+        contacts between the pairs that the pairwise mode would check count (pybullet also reports contacts within the
+        contact breaking threshold) and every candidate is confirmed with the query of the pairwise mode: the contact
+        points can report deep penetrations that getClosestPoints() does not find, which would reject valid states.
+        '''
+        self.robot.set_state(self.state_to_list(state))
+        p.performCollisionDetection()
+        for contact in p.getContactPoints(bodyA=self.robot_id):
+            body_b, link_a, link_b, distance = contact[2], contact[3], contact[4], contact[8]
+            if distance > utils.MAX_DISTANCE:
+                continue
+            if body_b == self.robot_id:
+                if (link_a, link_b) not in self.allowed_link_pairs:
+                    continue
+            elif (link_a, body_b) not in self.allowed_body_links:
+                continue
+            if utils.pairwise_link_collision(self.robot_id, link_a, body_b, link_b):
+                return False
+        return True
+
+    def _is_state_valid_incremental(self, state):
+        '''
+        Reuse the verdicts of the link pairs that did not move relative to the last checked state. Verdicts of pairs
+        that have not been checked (because an earlier pair already collided) are unknown and checked when needed.
+        '''
+        state = self.state_to_list(state)
+        if self.last_state is None:
+            self.pair_verdicts.clear()
+        else:
+            for i, (value, last_value) in enumerate(zip(state, self.last_state)):
+                if value != last_value:
+                    for pair in self.pairs_of_joint[i]:
+                        self.pair_verdicts.pop(pair, None)
+        self.last_state = state
+
+        self.robot.set_state(state)
+        for pair in self.check_link_pairs:
+            collision = self.pair_verdicts.get(pair)
+            if collision is None:
+                self.pair_cache_misses += 1
+                collision = utils.pairwise_link_collision(self.robot_id, pair[0], self.robot_id, pair[1])
+                self.pair_verdicts[pair] = collision
+            else:
+                self.pair_cache_hits += 1
+            if collision:
+                return False
+
+        # obstacles are not part of the robot, so their pairs are always checked
+        for body1, body2 in self.check_body_pairs:
+            if utils.pairwise_collision(body1, body2):
+                return False
+        return True
+
+    def setup_collision_detection(self, robot, obstacles, self_collisions = True, allow_collision_links = [],
+                                  disabled_collisions = set()):
+        '''
+        disabled_collisions: (link, link) pairs that are not checked (e.g. because they can never collide)
+        '''
+        self.check_link_pairs = utils.get_self_link_pairs(robot.id, robot.joint_idx,
+                                                          disabled_collisions=disabled_collisions) \
+            if self_collisions else []
+        if disabled_collisions:
+            print("{} link pairs to check, {} pairs disabled".format(len(self.check_link_pairs),
+                                                                    len(disabled_collisions)))
         moving_links = frozenset(
             [item for item in utils.get_moving_links(robot.id, robot.joint_idx) if not item in allow_collision_links])
         moving_bodies = [(robot.id, moving_links)]
         self.check_body_pairs = list(product(moving_bodies, obstacles))
 
+        # the same pairs for the batched mode, in both orders because pybullet may report a pair either way
+        self.allowed_link_pairs = set(self.check_link_pairs) | set(pair[::-1] for pair in self.check_link_pairs)
+        self.allowed_body_links = set(product(moving_links, obstacles))
+
+        # the pairs that have to be checked again in the incremental mode if a joint changed (index of the state)
+        self.pairs_of_joint = []
+        for joint in robot.joint_idx:
+            moved_links = set(utils.get_link_subtree(robot.id, utils.child_link_from_joint(joint)))
+            self.pairs_of_joint.append([pair for pair in self.check_link_pairs
+                                        if pair[0] in moved_links or pair[1] in moved_links])
+        self.pair_verdicts = {}  # (link1, link2) -> collision in last_state
+        self.last_state = None
+
+    def get_states_per_second(self):
+        '''
+        Throughput of the state validity checker since the last call of reset_statistics().
+        '''
+        if self.state_check_time == 0:
+            return 0.
+        return self.num_state_checks / self.state_check_time
+
+    def reset_statistics(self):
+        self.num_state_checks = 0
+        self.state_check_time = 0.
+        self.pair_cache_hits = 0
+        self.pair_cache_misses = 0
+
     def set_planner(self, planner_name):
         '''
         Note: Add your planner here!!
@@ -214,9 +329,11 @@ class PbOMPL():
 
         self.ss.setPlanner(self.planner)
 
-    def plan_start_goal(self, start, goal, allowed_time = DEFAULT_PLANNING_TIME):
+    def plan_start_goal(self, start, goal, allowed_time = DEFAULT_PLANNING_TIME, interpolate = True):
         '''
         plan a path to gaol from the given robot start state
+        interpolate: interpolate and validate the solution path right away. Otherwise the returned path is empty and
+                     get_solution_path() does it when the path is needed.
         '''
         print("start_planning")
         print(self.planner.params())
@@ -259,20 +376,17 @@ class PbOMPL():
             self.ss.setGoal(goal_space)     # use goal SPACE instead of goal STATE
 
         # attempt to solve the problem within allowed planning time
+        self.reset_statistics()
         solved = self.ss.solve(allowed_time)
+        print("checked {} states ({:.0f} states/s, collision mode {})".format(
+            self.num_state_checks, self.get_states_per_second(), self.collision_mode))
+        if self.collision_mode == "incremental":
+            print("reused {} and queried {} pair verdicts".format(self.pair_cache_hits, self.pair_cache_misses))
         res = False
         sol_path_list = []
         if solved:
-            print("Found solution: interpolating into {} segments".format(INTERPOLATE_NUM))
-            # print the path to screen
-            sol_path_geometric = self.ss.getSolutionPath()
-            sol_path_geometric.interpolate(INTERPOLATE_NUM)
-            sol_path_states = sol_path_geometric.getStates()
-            sol_path_list = [self.state_to_list(state) for state in sol_path_states]
-            # print(len(sol_path_list))
-            # print(sol_path_list)
-            for sol_path in sol_path_list:
-                self.is_state_valid(sol_path)
+            if interpolate:
+                sol_path_list = self.get_solution_path()
             res = True
         else:
             print("No solution found")
@@ -281,12 +395,54 @@ class PbOMPL():
         self.robot.set_state(orig_robot_state)
         return res, sol_path_list
 
-    def plan(self, goal, allowed_time = DEFAULT_PLANNING_TIME):
+    def get_solution_path(self, interpolate_num = INTERPOLATE_NUM):
+        '''
+        interpolate the solution path of the last plan into interpolate_num segments, validate its states and return it
+        '''
+        print("Found solution: interpolating into {} segments".format(interpolate_num))
+        orig_robot_state = self.robot.get_cur_state()
+        # print the path to screen
+        sol_path_geometric = self.ss.getSolutionPath()
+        sol_path_geometric.interpolate(interpolate_num)
+        sol_path_states = sol_path_geometric.getStates()
+        sol_path_list = [self.state_to_list(state) for state in sol_path_states]
+        # print(len(sol_path_list))
+        # print(sol_path_list)
+        for sol_path in sol_path_list:
+            self.is_state_valid(sol_path)
+        self.robot.set_state(orig_robot_state)
+        return sol_path_list
+
+    def get_solution_states(self):
+        '''
+        states of the solution path of the last plan (not interpolated)
+        '''
+        return [self.state_to_list(state) for state in self.ss.getSolutionPath().getStates()]
+
+    def check_path(self, path):
+        '''
+        check every state of a path (list of states) and the motions between consecutive states like the planner does
+        '''
+        if not self.si.isSetup():
+            self.si.setup()
+        orig_robot_state = self.robot.get_cur_state()
+        states = []
+        for q in path:
+            state = ob.State(self.space)
+            for i in range(self.robot.num_dim):
+                state[i] = q[i]
+            states.append(state)
+        valid = all(self.si.isValid(state()) for state in states) and \
+            all(self.si.checkMotion(a(), b()) for a, b in zip(states, states[1:]))
+        self.robot.set_state(orig_robot_state)
+        return valid
+
+    def plan(self, goal, allowed_time = DEFAULT_PLANNING_TIME, interpolate = True):
         '''
         plan a path to gaol from current robot state
         '''
         start = self.robot.get_cur_state()
-        return self.plan_start_goal(start, goal, allowed_time=allowed_time)
+        return self.plan_start_goal(start, goal, allowed_time=allowed_time, interpolate=interpolate)
 
     def execute(self, path, dynamics=False):
         '''
@@ -1,4 +1,5 @@
 import pb_ompl
+from path_certificate import write_certificate
 import sys
 import os
 import pybullet as p
@@ -6,6 +7,8 @@ from ast import literal_eval
 
 DIR = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(DIR)
+sys.path.append(os.path.join(os.path.dirname(DIR), "src"))
+from collision_matrix import never_colliding_pairs
 
 # default values for optional arguments
 # provide arguments when executing this script with python3 like so:
@@ -20,6 +23,9 @@ PLANNER = sys.argv[6] if len(sys.argv) > 6 else "RRTConnect"
 HAVE_EXACT_SOLUTION = literal_eval(sys.argv[7]) if len(sys.argv) > 7 else True
 ONLY_CHECK_START_STATE_VALIDITY = literal_eval(sys.argv[8]) if len(sys.argv) > 8 else False
 URDF_USE_SELF_COLLISION = literal_eval(sys.argv[9]) if len(sys.argv) > 9 else False  # seems to have no effect
+COLLISION_MODE = sys.argv[10] if len(sys.argv) > 10 else "pairwise"  # or "batched"/"incremental" (see pb_ompl.PbOMPL)
+CERTIFICATE = sys.argv[11] if len(sys.argv) > 11 else ""  # save a found solution as path certificate to this file
+PRUNE_PAIRS = literal_eval(sys.argv[12]) if len(sys.argv) > 12 else False  # skip pairs that can never collide
 
 if FILEPATH_FOR_INPUT == "/absolute/path/to/urdf/puzzle.urdf":
     print("""\n\tPLEASE provide arguments when executing this script with python3 like so:
@@ -32,7 +38,7 @@ else:
     p.connect(p.DIRECT)
 
 # load robot
-if URDF_USE_SELF_COLLISION:
+if URDF_USE_SELF_COLLISION or COLLISION_MODE == "batched":
     robot_id = p.loadURDF(FILEPATH_FOR_INPUT, (0, 0, 0), useFixedBase=1, flags=p.URDF_USE_SELF_COLLISION)
 else:
     robot_id = p.loadURDF(FILEPATH_FOR_INPUT, (0, 0, 0), useFixedBase=1)
@@ -40,7 +46,8 @@ else:
 robot = pb_ompl.PbOMPLRobot(robot_id)
 
 # setup pb_ompl
-pb_ompl_interface = pb_ompl.PbOMPL(robot)
+never_colliding = never_colliding_pairs(FILEPATH_FOR_INPUT) if PRUNE_PAIRS else ()
+pb_ompl_interface = pb_ompl.PbOMPL(robot, collision_mode=COLLISION_MODE, never_colliding_pairs=never_colliding)
 
 if ONLY_CHECK_START_STATE_VALIDITY:
     valid = pb_ompl_interface.is_state_valid(START_STATE)
@@ -53,11 +60,14 @@ if ONLY_CHECK_START_STATE_VALIDITY:
 pb_ompl_interface.set_planner(PLANNER)
 
 robot.set_state(START_STATE)
-found_solution, path = pb_ompl_interface.plan(GOAL_SPACE, ALLOWED_PLANNING_TIME)
+# the path is only interpolated if it is shown
+found_solution, path = pb_ompl_interface.plan(GOAL_SPACE, ALLOWED_PLANNING_TIME, interpolate=SHOW_GUI)
 
 if HAVE_EXACT_SOLUTION:
     found_solution = pb_ompl_interface.ss.haveExactSolutionPath()
 # print("PATH FOUND:", path)
+if found_solution and CERTIFICATE:
+    write_certificate(CERTIFICATE, START_STATE, GOAL_SPACE, pb_ompl_interface.get_solution_states())
 if found_solution and SHOW_GUI:
     pb_ompl_interface.execute(path)
 
@@ -0,0 +1,193 @@
+'''
+Long-lived counterpart of pybullet_ompl.py.
+
+Keeps OMPL imported and a p.DIRECT client connected and answers solvability requests until stdin is closed.
+Every request is one JSON object per line on stdin, every response is one JSON object per line on the original stdout:
+
+    {"urdf_path": "...", "start_state": [0, 0], "goal_space": [[1, 1], [0, 1]], "allowed_planning_time": 5.0,
+     "planner": "RRTConnect", "have_exact_solution": true, "only_check_start_state_validity": false,
+     "collision_mode": "pairwise"}
+
+    {"returncode": 0, "found_solution": true, "planning_time": 0.042, "states_per_second": 51234.5,
+     "pair_cache_hits": 0, "pair_cache_misses": 0}
+
+"collision_mode" is optional (see pb_ompl.PbOMPL). With "prune_pairs": true the link pairs that can never collide
+(the allowed collision matrix of src/collision_matrix.py, the same one that is written into the SRDF) are not checked.
+With "save_certificate": "/path/to/puzzle.path" a found solution is saved as path certificate (see path_certificate.py).
+With "benchmark": true the response also contains the properties of the planning run in "run" (see
+SolverState.benchmark_run()).
+
+A stored certificate is verified without planning by replaying it through the collision checker:
+
+    {"urdf_path": "...", "verify_certificate": "/path/to/puzzle.path", "start_state": [0, 0], "goal_space": null}
+
+    {"returncode": 0, "valid": true, "verification_time": 0.003}
+
+"start_state" and "goal_space" are optional, if given they must match the ones of the certificate.
+
+The verdicts of the collision checker for given states or for a number of random states within the joint limits (e.g.
+to compare collision modes or a merged and an unmerged puzzle, see compare_state_validity() in
+src/pybullet_simulation.py):
+
+    {"urdf_path": "...", "check_states": 1000, "seed": 0, "collision_mode": "batched"}
+
+    {"returncode": 0, "joint_names": ["joint_0", "joint_1"], "states": [[0.3, 1.2], ...], "valid": [true, ...]}
+
+Everything that pybullet, OMPL and pb_ompl print is redirected to stderr, so it can not corrupt the responses.
+'''
+import os
+import sys
+import json
+import time
+import random
+from hashlib import sha1
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(DIR)
+sys.path.append(os.path.join(os.path.dirname(DIR), "src"))
+
+# keep a private copy of stdout for the responses and send all other output (including output of C extensions) to stderr
+protocol = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+sys.stdout = sys.stderr
+
+import pybullet as p
+import pb_ompl
+import utils
+from path_certificate import write_certificate, read_certificate
+from collision_matrix import never_colliding_pairs
+
+
+class SolverState():
+    '''
+    The loaded puzzle and its PbOMPL interface. The puzzle is only reloaded if the content of the URDF file changed.
+    '''
+    def __init__(self) -> None:
+        p.connect(p.DIRECT)
+        self.urdf_key = None
+        self.robot = None
+        self.interface = None
+
+    def load(self, urdf_path, collision_mode="pairwise", prune_pairs=False):
+        with open(urdf_path, 'rb') as f:
+            urdf_key = (urdf_path, sha1(f.read()).hexdigest(), collision_mode, prune_pairs)
+        if urdf_key == self.urdf_key:
+            return
+        self.urdf_key = None
+        p.resetSimulation()
+        utils.reset_kinematic_trees()
+        if collision_mode == "batched":
+            robot_id = p.loadURDF(urdf_path, (0, 0, 0), useFixedBase=1, flags=p.URDF_USE_SELF_COLLISION)
+        else:
+            robot_id = p.loadURDF(urdf_path, (0, 0, 0), useFixedBase=1)
+        self.robot = pb_ompl.PbOMPLRobot(robot_id)
+        self.interface = pb_ompl.PbOMPL(self.robot, collision_mode=collision_mode,
+                                        never_colliding_pairs=never_colliding_pairs(urdf_path) if prune_pairs else ())
+        self.urdf_key = urdf_key
+
+    def handle(self, request):
+        self.load(request["urdf_path"], request.get("collision_mode", "pairwise"), request.get("prune_pairs", False))
+        if "verify_certificate" in request:
+            return self.verify_certificate(request["verify_certificate"], request.get("start_state"),
+                                           request.get("goal_space"))
+        if "check_states" in request:
+            return self.check_states(request["check_states"], request.get("seed", 0))
+        start_state = request["start_state"]
+        self.robot.reset()
+
+        if request["only_check_start_state_validity"]:
+            valid = self.interface.is_state_valid(start_state)
+            return {"returncode": 0 if valid else 1, "start_state_valid": valid}
+
+        goal_space = [tuple(goal) for goal in request["goal_space"]]
+        self.interface.set_planner(request["planner"])
+        self.interface.ss.clear()
+        self.robot.set_state(start_state)
+        begin = time.time()
+        found_solution, _ = self.interface.plan(goal_space, request["allowed_planning_time"], interpolate=False)
+        planning_time = time.time() - begin
+        if request["have_exact_solution"]:
+            found_solution = self.interface.ss.haveExactSolutionPath()
+        response = {"returncode": 0 if found_solution else 1, "found_solution": found_solution,
+                    "planning_time": planning_time, "states_per_second": self.interface.get_states_per_second(),
+                    "pair_cache_hits": self.interface.pair_cache_hits,
+                    "pair_cache_misses": self.interface.pair_cache_misses}
+        if request.get("benchmark", False):
+            response["run"] = self.benchmark_run()
+        if found_solution and request.get("save_certificate"):
+            write_certificate(request["save_certificate"], start_state, goal_space,
+                              self.interface.get_solution_states())
+        return response
+
+    def verify_certificate(self, filepath, start_state=None, goal_space=None, tolerance=1e-6):
+        '''
+        The certificate is valid if it belongs to the given problem, its path leads from the start state into the goal
+        space and all its states and motions are valid.
+        '''
+        begin = time.time()
+        certificate_start, certificate_goal, path = read_certificate(filepath)
+
+        def close(a, b):
+            return len(a) == len(b) and all(abs(x - y) <= tolerance for x, y in zip(a, b))
+
+        goal_bounds = [list(goal) if isinstance(goal, (tuple, list)) else [goal, goal] for goal in goal_space or []]
+        valid = len(certificate_start) == self.robot.num_dim and len(path) > 0 \
+            and (start_state is None or close(start_state, certificate_start)) \
+            and (goal_space is None or close(sum(goal_bounds, []), sum(map(list, certificate_goal), []))) \
+            and close(path[0], certificate_start) \
+            and all(low - tolerance <= x <= high + tolerance for x, (low, high) in zip(path[-1], certificate_goal)) \
+            and self.interface.check_path(path)
+        return {"returncode": 0 if valid else 1, "valid": valid, "verification_time": time.time() - begin}
+
+    def check_states(self, states, seed=0):
+        '''
+        states: list of states or the number of states to sample uniformly within the joint limits.
+        '''
+        if isinstance(states, int):
+            generator = random.Random(seed)
+            states = [[generator.uniform(low, high) for low, high in self.robot.joint_bounds] for _ in range(states)]
+        valid = [self.interface.is_state_valid(state) for state in states]
+        joint_names = [p.getJointInfo(self.robot.id, joint)[1].decode() for joint in self.robot.joint_idx]
+        return {"returncode": 0, "joint_names": joint_names, "states": states, "valid": valid}
+
+    def benchmark_run(self):
+        '''
+        Properties of the last planning run with the names of the OMPL benchmark database (see src/benchmark.py).
+        '''
+        ss = self.interface.ss
+        solved = ss.haveSolutionPath()
+        exact = ss.haveExactSolutionPath()
+        planner_data = pb_ompl.ob.PlannerData(ss.getSpaceInformation())
+        ss.getPlannerData(planner_data)
+        run = {
+            "time": ss.getLastPlanComputationTime(),
+            "solved": solved,
+            "approximate_solution": solved and not exact,
+            "correct_solution": exact and ss.getSolutionPath().check(),
+            "status": str(ss.getLastPlannerStatus()),
+            "graph_states": planner_data.numVertices(),
+            "graph_motions": planner_data.numEdges(),
+        }
+        if solved:
+            run["solution_length"] = ss.getSolutionPath().length()
+        return run
+
+
+def main():
+    state = SolverState()
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        try:
+            response = state.handle(request)
+        except Exception as e:
+            # e.g. the URDF could not be loaded, make sure it is loaded again with the next request
+            state.urdf_key = None
+            response = {"returncode": 1, "error": repr(e)}
+        protocol.write(json.dumps(response) + "\n")
+        protocol.flush()
+
+
+if __name__ == '__main__':
+    main()
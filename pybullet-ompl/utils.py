@@ -61,12 +61,11 @@ def get_self_link_pairs(body, joints, disabled_collisions=set(), only_moving=Tru
     return check_link_pairs
 
 def get_moving_links(body, joints):
-    moving_links = set()
+    tree = get_kinematic_tree(body)
+    moving_links = 0
     for joint in joints:
-        link = child_link_from_joint(joint)
-        if link not in moving_links:
-            moving_links.update(get_link_subtree(body, link))
-    return list(moving_links)
+        moving_links |= tree.subtree_bits[child_link_from_joint(joint)]
+    return tree.links_of(moving_links)
 
 def get_moving_pairs(body, moving_joints):
     """
@@ -74,14 +73,93 @@ def get_moving_pairs(body, moving_joints):
     Do not check all fixed and fixed pairs
     Check all moving pairs with a common
     """
+    tree = get_kinematic_tree(body)
+    moving_joints_bits = tree.bits(moving_joints)
     moving_links = get_moving_links(body, moving_joints)
     for link1, link2 in combinations(moving_links, 2):
-        ancestors1 = set(get_joint_ancestors(body, link1)) & set(moving_joints)
-        ancestors2 = set(get_joint_ancestors(body, link2)) & set(moving_joints)
+        ancestors1 = tree.joint_ancestor_bits[link1] & moving_joints_bits
+        ancestors2 = tree.joint_ancestor_bits[link2] & moving_joints_bits
         if ancestors1 != ancestors2:
             yield link1, link2
 
 
+def get_link_indices(body, link_pairs):
+    """
+    Translate pairs of link names (e.g. the never colliding pairs of src/collision_matrix.py) into pairs of link
+    indices. Pairs with unknown links are skipped.
+    """
+    indices = {p.getBodyInfo(body)[0].decode(): BASE_LINK}
+    indices.update((get_joint_info(body, joint).linkName.decode(), joint) for joint in get_joints(body))
+    return set((indices[link1], indices[link2]) for link1, link2 in link_pairs if link1 in indices and link2 in indices)
+
+
+class KinematicTree():
+    """
+    Index of the link tree of a body, built with one p.getJointInfo call per link.
+    Sets of links are bitsets (python ints) with bit (link + 1) for every link, so BASE_LINK is bit 0.
+    """
+    def __init__(self, body):
+        self.num_joints = p.getNumJoints(body)
+        self.links = list(range(self.num_joints))
+        self.parents = [get_joint_info(body, link).parentIndex for link in self.links]
+        self.children = {}
+        for child, parent in enumerate(self.parents):
+            self.children.setdefault(parent, []).append(child)
+
+        # parents always have a smaller index than their children in pybullet
+        self.ancestors = []  # in order of depth, without the link itself
+        self.joint_ancestor_bits = []  # ancestors and the link itself
+        for link, parent in enumerate(self.parents):
+            if parent == BASE_LINK:
+                self.ancestors.append([BASE_LINK])
+                self.joint_ancestor_bits.append(self.bit(BASE_LINK) | self.bit(link))
+            else:
+                self.ancestors.append(self.ancestors[parent] + [parent])
+                self.joint_ancestor_bits.append(self.joint_ancestor_bits[parent] | self.bit(link))
+
+        self.subtree_bits = {link: self.bit(link) for link in [BASE_LINK] + self.links}
+        for link in reversed(self.links):
+            self.subtree_bits[self.parents[link]] |= self.subtree_bits[link]
+
+    @staticmethod
+    def bit(link):
+        return 1 << (link + 1)
+
+    def bits(self, links):
+        result = 0
+        for link in links:
+            result |= self.bit(link)
+        return result
+
+    def links_of(self, bits):
+        return [link for link in [BASE_LINK] + self.links if bits & self.bit(link)]
+
+    def parent(self, link):
+        if link == BASE_LINK:
+            return None
+        return self.parents[link]
+
+    def descendants(self, link):
+        # depth first like the recursive get_link_descendants
+        descendants = []
+        for child in self.children.get(link, []):
+            descendants.append(child)
+            descendants.extend(self.descendants(child))
+        return descendants
+
+
+_kinematic_trees = {}
+
+def get_kinematic_tree(body):
+    if body not in _kinematic_trees:
+        _kinematic_trees[body] = KinematicTree(body)
+    return _kinematic_trees[body]
+
+def reset_kinematic_trees():
+    """Forget all trees, e.g. after p.resetSimulation() because pybullet reuses the ids of removed bodies."""
+    _kinematic_trees.clear()
+
+
 #####################################
 
 JointInfo = namedtuple('JointInfo', ['jointIndex', 'jointName', 'jointType',
@@ -97,7 +175,7 @@ def child_link_from_joint(joint):
     return joint  # link
 
 def get_num_joints(body):
-    return p.getNumJoints(body)
+    return get_kinematic_tree(body).num_joints
 
 def get_joints(body):
     return list(range(get_num_joints(body)))
@@ -108,40 +186,33 @@ def get_all_links(body):
     return [BASE_LINK] + list(get_links(body))
 
 def get_link_parent(body, link):
-    if link == BASE_LINK:
-        return None
-    return get_joint_info(body, link).parentIndex
+    return get_kinematic_tree(body).parent(link)
 
 def get_all_link_parents(body):
-    return {link: get_link_parent(body, link) for link in get_links(body)}
+    return dict(enumerate(get_kinematic_tree(body).parents))
 
 def get_all_link_children(body):
-    children = {}
-    for child, parent in get_all_link_parents(body).items():
-        if parent not in children:
-            children[parent] = []
-        children[parent].append(child)
-    return children
+    return {parent: list(children) for parent, children in get_kinematic_tree(body).children.items()}
 
 def get_link_children(body, link):
-    children = get_all_link_children(body)
-    return children.get(link, [])
+    return list(get_kinematic_tree(body).children.get(link, []))
 
 
 def get_link_ancestors(body, link):
     # Returns in order of depth
     # Does not include link
-    parent = get_link_parent(body, link)
-    if parent is None:
+    if link == BASE_LINK:
         return []
-    return get_link_ancestors(body, parent) + [parent]
+    return list(get_kinematic_tree(body).ancestors[link])
 
 
 def get_joint_ancestors(body, joint):
     link = child_link_from_joint(joint)
     return get_link_ancestors(body, link) + [link]
 
-def get_link_descendants(body, link, test=lambda l: True):
+def get_link_descendants(body, link, test=None):
+    if test is None:
+        return get_kinematic_tree(body).descendants(link)
     descendants = []
     for child in get_link_children(body, link):
         if test(child):
@@ -156,4 +227,3 @@ def get_link_subtree(body, link, **kwargs):
 def are_links_adjacent(body, link1, link2):
     return (get_link_parent(body, link1) == link2) or \
            (get_link_parent(body, link2) == link1)
-
@@ -0,0 +1,110 @@
+"""
+Long-lived generator process for pipeline.py. Builds one puzzle per request and keeps Blender (or Python) running.
+Run it inside Blender for BlenderWorld or with plain Python for UrdfWorld:
+
+    blender -b -P src/batch_worker.py
+    python3 src/batch_worker.py
+
+Every request is one JSON object per line on stdin, every response is one line on the original stdout (RESPONSE_PREFIX
+followed by a JSON object):
+
+    {"world": "UrdfWorld", "world_config": {...}, "sampler": "GridWorldSampler", "sampler_config": {...},
+     "seed": 3, "puzzle_name": "grid_world_3", "defer_renders": false}
+
+    batch_worker response: {"seed": 3, "name": "grid_world_3", "returncode": 0, "problem_path": ".../problem.json",
+     "renders": [], "generation_time": 0.12, "memory": {"datablocks": 52, "created_datablocks": 3, "rss": 181075968}}
+
+With "defer_renders": true no images are rendered, "renders" contains the arguments for render_worker.py instead.
+With "output_directory" the puzzle is built in dir_for_output of the world config (the staging directory) and moved
+into output_directory when it is complete, so output_directory never contains half-written puzzles. The staging
+directory has to be on the same file system and the URDF must reference its meshes with relative paths.
+Everything else that is printed is redirected to stderr, so it can not corrupt the responses. Blender prints its
+banner to stdout before this script runs, so every response starts with RESPONSE_PREFIX and the reader skips all
+other lines.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import traceback
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(DIR)
+
+RESPONSE_PREFIX = "batch_worker response: "  # same as in pipeline.py
+
+# keep a private copy of stdout for the responses and send all other output (including output of Blender) to stderr
+protocol = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+sys.stdout = sys.stderr
+
+from world import BlenderWorld
+from urdf_world import UrdfWorld
+import sampling
+
+WORLDS = {"BlenderWorld": BlenderWorld, "UrdfWorld": UrdfWorld}
+
+_worlds = {}  # (world class name, world config) -> world, reused for all puzzles with the same world config
+
+
+def _moved(path, old_directory, new_directory):
+    return os.path.join(new_directory, os.path.relpath(path, old_directory))
+
+
+def build(request):
+    world_key = (request["world"], json.dumps(request["world_config"], sort_keys=True))
+    if world_key not in _worlds:
+        _worlds[world_key] = WORLDS[request["world"]](request["world_config"])
+    world = _worlds[world_key]
+    world.defer_renders = request.get("defer_renders", False)
+    world.deferred_renders = []
+
+    sampler_config = dict(request["sampler_config"])
+    sampler_config["seed_for_randomness"] = request["seed"]
+    sampler_config["puzzle_name"] = request["puzzle_name"]
+    sampler = getattr(sampling, request["sampler"])(sampler_config, world)
+    begin = time.time()
+    returncode = sampler.build()
+    generation_time = time.time() - begin
+    response = {"seed": request["seed"], "name": world.name, "returncode": 1 if returncode else 0,
+                "generation_time": generation_time, "renders": world.deferred_renders}
+    if not returncode:
+        if "output_directory" in request:
+            directory = os.path.join(request["output_directory"], world.name)
+            world.wait_for_renders()  # background render workers write into the staging directory
+            sampler.save_problem(urdf_path=_moved(world.urdf_path, world.directory, directory))
+            if os.path.exists(directory):
+                shutil.rmtree(directory)  # left over from an interrupted run
+            os.replace(world.directory, directory)
+            for render in world.deferred_renders:  # the images are rendered later, into the moved directory
+                render["views"] = [[_moved(filepath, world.directory, directory)] + view
+                                   for filepath, *view in render["views"]]
+                render["render_keys_path"] = _moved(render["render_keys_path"], world.directory, directory)
+            response["problem_path"] = os.path.abspath(directory + "/problem.json")
+        else:
+            response["problem_path"] = os.path.abspath(sampler.save_problem())
+    elif "output_directory" in request and os.path.exists(world.directory):
+        shutil.rmtree(world.directory)
+    if world.purge_orphans_on_reset:
+        world.reset()  # free the puzzle now, so the memory stats only show what is left over
+    response["memory"] = world.memory_stats()
+    return response
+
+
+def main():
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        try:
+            response = build(request)
+        except Exception as e:
+            traceback.print_exc()
+            response = {"seed": request.get("seed"), "name": request.get("puzzle_name"), "returncode": 1,
+                        "error": repr(e), "renders": []}
+        protocol.write(RESPONSE_PREFIX + json.dumps(response) + "\n")
+        protocol.flush()
+
+
+main()
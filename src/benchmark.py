@@ -0,0 +1,155 @@
+"""
+Benchmark planners on generated puzzles with the local pybullet/OMPL stack (no ROS and no robowflex workspace needed).
+The runs are spread over a SolverPool and the results are written into an SQLite database with the schema of OMPL's
+benchmark tools, so they can be plotted with [ompl_benchmark_plotter](https://github.com/aorthey/ompl_benchmark_plotter)
+or [Planner Arena](http://plannerarena.org).
+"""
+import os
+import sys
+import json
+import socket
+import sqlite3
+import platform
+from datetime import datetime
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(DIR)
+from pybullet_simulation import SolverPool
+
+# values of the enum ompl::base::PlannerStatus::StatusType and their descriptions (PlannerStatus::asString())
+PLANNER_STATUS = ("Unknown status", "Invalid start", "Invalid goal", "Unrecognized goal type", "Timeout",
+                  "Approximate solution", "Exact solution", "Crash", "Abort")
+CRASH = PLANNER_STATUS.index("Crash")
+
+# run properties that are written into the database (see SolverState.benchmark_run() in pybullet-ompl/solver_worker.py)
+RUN_PROPERTIES = (
+    ("time", "REAL"),
+    ("solved", "BOOLEAN"),
+    ("approximate_solution", "BOOLEAN"),
+    ("correct_solution", "BOOLEAN"),
+    ("solution_length", "REAL"),
+    ("graph_states", "INTEGER"),
+    ("graph_motions", "INTEGER"),
+    ("status", "ENUM"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments
+    (id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR(512), totaltime REAL, timelimit REAL, memorylimit REAL,
+     runcount INTEGER, version VARCHAR(128), hostname VARCHAR(1024), cpuinfo TEXT, date DATETIME, seed INTEGER,
+     setup TEXT);
+CREATE TABLE IF NOT EXISTS plannerConfigs
+    (id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR(512) NOT NULL, settings TEXT);
+CREATE TABLE IF NOT EXISTS enums
+    (name VARCHAR(512), value INTEGER, description TEXT, PRIMARY KEY (name, value));
+CREATE TABLE IF NOT EXISTS runs
+    (id INTEGER PRIMARY KEY AUTOINCREMENT, experimentid INTEGER, plannerid INTEGER,
+     FOREIGN KEY (experimentid) REFERENCES experiments(id) ON DELETE CASCADE,
+     FOREIGN KEY (plannerid) REFERENCES plannerConfigs(id) ON DELETE CASCADE);
+CREATE TABLE IF NOT EXISTS progress
+    (runid INTEGER, time REAL, PRIMARY KEY (runid, time), FOREIGN KEY (runid) REFERENCES runs(id) ON DELETE CASCADE);
+CREATE VIEW IF NOT EXISTS runsView AS SELECT * FROM plannerConfigs INNER JOIN experiments INNER JOIN runs
+    ON plannerConfigs.id=runs.plannerid AND experiments.id=runs.experimentid;
+"""
+
+
+def load_problem(filepath):
+    """Load a problem that has been saved with PuzzleSampler.save_problem()."""
+    with open(filepath, "r") as f:
+        return json.load(f)
+
+
+def _run_from_response(response, planning_time):
+    """Convert a solver worker response into a row of the runs table (a crashed worker counts as crashed run)."""
+    if "run" not in response:
+        return {"time": planning_time, "solved": False, "approximate_solution": False, "correct_solution": False,
+                "status": CRASH}
+    run = dict(response["run"])
+    run["status"] = PLANNER_STATUS.index(run["status"]) if run["status"] in PLANNER_STATUS else 0
+    return run
+
+
+def write_database(database_path, experiments):
+    """
+    Add the experiments to the database (it is created if it does not exist yet). Every experiment is a dict with
+    "name", "setup", "timelimit", "runcount", "totaltime" and "results" ({planner name: [run, ...]}).
+    """
+    connection = sqlite3.connect(database_path)
+    cursor = connection.cursor()
+    cursor.executescript(SCHEMA)
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(runs)")]
+    for name, sql_type in RUN_PROPERTIES:
+        if name not in columns:
+            cursor.execute('ALTER TABLE runs ADD "{}" {}'.format(name, sql_type))
+    cursor.executemany("INSERT OR IGNORE INTO enums VALUES (?, ?, ?)",
+                       [("status", value, description) for value, description in enumerate(PLANNER_STATUS)])
+
+    for experiment in experiments:
+        cursor.execute("INSERT INTO experiments (name, totaltime, timelimit, memorylimit, runcount, version, hostname, "
+                       "cpuinfo, date, seed, setup) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (experiment["name"], experiment["totaltime"], experiment["timelimit"], 0.,
+                        experiment["runcount"], "puzzle-generator pybullet_ompl", socket.gethostname(),
+                        platform.processor() or platform.machine(), datetime.now().isoformat(" ", "seconds"), 0,
+                        experiment["setup"]))
+        experiment_id = cursor.lastrowid
+        for planner, runs in experiment["results"].items():
+            planner_name = "geometric_" + planner
+            row = cursor.execute("SELECT id FROM plannerConfigs WHERE name = ?", (planner_name,)).fetchone()
+            if row:
+                planner_id = row[0]
+            else:
+                cursor.execute("INSERT INTO plannerConfigs (name, settings) VALUES (?, ?)", (planner_name, "{}"))
+                planner_id = cursor.lastrowid
+            for run in runs:
+                names = [name for name, _ in RUN_PROPERTIES if name in run]
+                cursor.execute('INSERT INTO runs (experimentid, plannerid, {}) VALUES (?, ?, {})'.format(
+                    ", ".join('"' + name + '"' for name in names), ", ".join("?" * len(names))),
+                    [experiment_id, planner_id] + [run[name] for name in names])
+    connection.commit()
+    connection.close()
+
+
+def benchmark(problem_paths, planners=("RRTConnect",), planning_time=5., runs=10, database_path="benchmark.db",
+              processes=None, collision_mode="pairwise"):
+    """
+    Solve every problem (see PuzzleSampler.save_problem()) runs times with every planner (any planner that
+    PbOMPL.set_planner() supports) and write the results into database_path. The runs are distributed over processes
+    solver workers (one per CPU by default). Returns the path of the database.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    problems = [load_problem(problem_path) for problem_path in problem_paths]
+    pool = SolverPool(processes)
+    experiments = []
+    try:
+        futures = []  # [{planner: [future of each run]} for each problem]
+        for problem in problems:
+            futures.append({})
+            for planner in planners:
+                request = {
+                    "urdf_path": problem["urdf_path"],
+                    "start_state": problem["start_state"],
+                    "goal_space": problem["goal_space"],
+                    "allowed_planning_time": planning_time,
+                    "planner": planner,
+                    "have_exact_solution": True,
+                    "only_check_start_state_validity": False,
+                    "collision_mode": collision_mode,
+                    "benchmark": True,
+                }
+                futures[-1][planner] = [pool.submit_request(request) for _ in range(runs)]
+
+        for problem, problem_futures in zip(problems, futures):
+            results = {planner: [_run_from_response(future.result(), planning_time) for future in planner_futures]
+                       for planner, planner_futures in problem_futures.items()}
+            print("benchmarked", problem["name"])
+            # all problems share the pool, so the wall time would include the runs of the other problems
+            totaltime = sum(run["time"] for planner_runs in results.values() for run in planner_runs)
+            experiments.append({"name": problem["name"], "setup": json.dumps(problem), "timelimit": planning_time,
+                                "runcount": runs, "totaltime": totaltime, "results": results})
+    finally:
+        pool.close()
+    write_database(database_path, experiments)
+    print("benchmark results:")
+    print("file://" + os.path.abspath(database_path))
+    return database_path
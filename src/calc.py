@@ -1,4 +1,4 @@
-from math import radians, cos, sin
+from math import radians, cos, sin, sqrt, atan2
 
 
 RAD45 = round(radians(45), 5)
@@ -36,3 +36,90 @@ def rotate(point_2d, angle_radians):
     x = round(point_2d[0] * c - point_2d[1] * s, 5)
     y = round(point_2d[0] * s + point_2d[1] * c, 5)
     return x, y
+
+
+def euler_to_matrix(rotation):
+    """Return the rotation matrix (tuple of rows) of XYZ euler angles like Blender's rotation_euler or URDF's rpy."""
+    ca, cb, cc = cos(rotation[0]), cos(rotation[1]), cos(rotation[2])
+    sa, sb, sc = sin(rotation[0]), sin(rotation[1]), sin(rotation[2])
+    return ((cb * cc, sa * sb * cc - ca * sc, ca * sb * cc + sa * sc),
+            (cb * sc, sa * sb * sc + ca * cc, ca * sb * sc - sa * cc),
+            (-sb, sa * cb, ca * cb))
+
+
+def matrix_to_euler(matrix):
+    """Return the XYZ euler angles of a rotation matrix, each angle within [-pi, pi] (like URDF's rpy)."""
+    cy = sqrt(matrix[0][0] ** 2 + matrix[1][0] ** 2)
+    if cy > 1e-12:
+        return atan2(matrix[2][1], matrix[2][2]), atan2(-matrix[2][0], cy), atan2(matrix[1][0], matrix[0][0])
+    return atan2(-matrix[1][2], matrix[1][1]), atan2(-matrix[2][0], cy), 0.
+
+
+def axis_angle_to_matrix(axis, angle):
+    """Return the rotation matrix (tuple of rows) of a rotation by angle around the (normalized) axis."""
+    x, y, z = axis
+    c, s = cos(angle), sin(angle)
+    t = 1 - c
+    return ((t * x * x + c, t * x * y - s * z, t * x * z + s * y),
+            (t * x * y + s * z, t * y * y + c, t * y * z - s * x),
+            (t * x * z - s * y, t * y * z + s * x, t * z * z + c))
+
+
+def rotate_3d(point_3d, rotation):
+    """Rotate point_3d around the origin (0, 0, 0) by XYZ euler angles."""
+    matrix = euler_to_matrix(rotation)
+    return tuple(sum(row[i] * point_3d[i] for i in range(3)) for row in matrix)
+
+
+def rectangle_corners(center, size, angle_radians):
+    """Return the corners of a rectangle with the given center, size (x, y) and rotation (around its center)."""
+    half_x = size[0] / 2
+    half_y = size[1] / 2
+    corners = ((half_x, half_y), (-half_x, half_y), (-half_x, -half_y), (half_x, -half_y))
+    return [tuple_add(center, rotate(corner, angle_radians)) for corner in corners]
+
+
+def _project(polygon, axis):
+    dots = [point[0] * axis[0] + point[1] * axis[1] for point in polygon]
+    return min(dots), max(dots)
+
+
+def polygons_intersect(polygon_a, polygon_b):
+    """
+    Return True if two convex polygons (lists of corners) intersect or touch.
+    https://en.wikipedia.org/wiki/Hyperplane_separation_theorem
+    """
+    for polygon in (polygon_a, polygon_b):
+        for i in range(len(polygon)):
+            a = polygon[i]
+            b = polygon[(i + 1) % len(polygon)]
+            axis = a[1] - b[1], b[0] - a[0]  # normal of the edge from a to b
+            min_a, max_a = _project(polygon_a, axis)
+            min_b, max_b = _project(polygon_b, axis)
+            if max_a < min_b or max_b < min_a:
+                return False
+    return True
+
+
+def polygon_intersects_circle(polygon, center, radius):
+    """Return True if a convex polygon (list of corners) and a circle intersect or touch."""
+    inside = True
+    sign = 0
+    for i in range(len(polygon)):
+        a = polygon[i]
+        b = polygon[(i + 1) % len(polygon)]
+        edge = b[0] - a[0], b[1] - a[1]
+        to_center = center[0] - a[0], center[1] - a[1]
+        cross = edge[0] * to_center[1] - edge[1] * to_center[0]
+        if cross != 0:
+            if sign == 0:
+                sign = 1 if cross > 0 else -1
+            elif (cross > 0) != (sign > 0):
+                inside = False
+        # distance between center and edge
+        length_squared = edge[0] ** 2 + edge[1] ** 2
+        t = max(0, min(1, (to_center[0] * edge[0] + to_center[1] * edge[1]) / length_squared))
+        closest = a[0] + t * edge[0], a[1] + t * edge[1]
+        if (center[0] - closest[0]) ** 2 + (center[1] - closest[1]) ** 2 <= radius ** 2:
+            return True
+    return inside
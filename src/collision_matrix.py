@@ -0,0 +1,203 @@
+"""
+Allowed collision matrix of a puzzle: the link pairs that can never collide because the AABBs that their collision
+objects sweep over the whole range of their joints do not overlap. The pairs are written into the SRDF as
+<disable_collisions> elements, so planners that read the SRDF (like robowflex) do not have to check them, and
+pybullet_ompl skips the same pairs with prune_pairs (see solve() in pybullet_simulation.py).
+"""
+import os
+import re
+import struct
+import xml.etree.ElementTree as ET
+from itertools import combinations
+from math import cos, pi, ceil, dist
+
+import calc
+
+MAX_ANGLE_STEP = 0.2  # revolute joints are sampled at least this fine (in radians)
+MAX_SAMPLES = 4096  # links with more sampled poses are treated as if they could be anywhere
+MARGIN = 0.01  # pairs whose swept AABBs are closer than this may collide
+
+# (filepath, modification time) -> (low, high) corners of the vertices of an STL file
+_stl_bounds_cache = {}
+
+
+def _vector(text, default=(0, 0, 0)):
+    return tuple(float(x) for x in text.split()) if text else default
+
+
+def _stl_bounds(filepath):
+    """Return the lowest and highest corner of the vertices of a binary or ASCII STL file."""
+    key = (filepath, os.path.getmtime(filepath))
+    if key not in _stl_bounds_cache:
+        with open(filepath, 'rb') as f:
+            content = f.read()
+        number_triangles = struct.unpack('<I', content[80:84])[0] if len(content) >= 84 else 0
+        if len(content) == 84 + 50 * number_triangles:
+            vertices = []
+            for i in range(number_triangles):
+                values = struct.unpack('<12f', content[96 + 50 * i:132 + 50 * i])
+                vertices.extend((values[j:j + 3] for j in range(0, 9, 3)))
+        else:
+            vertices = [_vector(match.decode()) for match in re.findall(rb'vertex\s+([^\n]+)', content)]
+        low = tuple(min(vertex[i] for vertex in vertices) for i in range(3))
+        high = tuple(max(vertex[i] for vertex in vertices) for i in range(3))
+        _stl_bounds_cache[key] = (low, high)
+    return _stl_bounds_cache[key]
+
+
+def _box_corners(low, high):
+    return [(x, y, z) for x in (low[0], high[0]) for y in (low[1], high[1]) for z in (low[2], high[2])]
+
+
+def _geometry_corners(geometry, urdf_directory):
+    """Return the corners of a box around the geometry (in its own frame) or None if the geometry is unknown."""
+    shape = geometry[0]
+    if shape.tag == 'box':
+        half = [x / 2 for x in _vector(shape.get('size'))]
+        return _box_corners([-x for x in half], half)
+    if shape.tag == 'cylinder':
+        radius, half_length = float(shape.get('radius')), float(shape.get('length')) / 2
+        return _box_corners((-radius, -radius, -half_length), (radius, radius, half_length))
+    if shape.tag == 'sphere':
+        radius = float(shape.get('radius'))
+        return _box_corners((-radius,) * 3, (radius,) * 3)
+    if shape.tag == 'mesh':
+        filepath = shape.get('filename').replace('file://', '')
+        filepath = os.path.join(urdf_directory, filepath)  # relative paths are relative to the URDF
+        if not filepath.lower().endswith('.stl') or not os.path.isfile(filepath):
+            return None
+        scale = _vector(shape.get('scale'), (1, 1, 1))
+        low, high = _stl_bounds(filepath)
+        return _box_corners(*(tuple(x * s for x, s in zip(corner, scale)) for corner in (low, high)))
+    return None
+
+
+def _apply(transform, point):
+    rotation, translation = transform
+    return tuple(sum(row[i] * point[i] for i in range(3)) + t for row, t in zip(rotation, translation))
+
+
+def _compose(transform_a, transform_b):
+    rotation_a, translation_a = transform_a
+    rotation_b, translation_b = transform_b
+    rotation = tuple(tuple(sum(row[k] * rotation_b[k][j] for k in range(3)) for j in range(3)) for row in rotation_a)
+    return rotation, _apply(transform_a, translation_b)
+
+
+def _origin(element):
+    """Return the transform of the <origin> child of the element."""
+    origin = element.find('origin')
+    if origin is None:
+        return calc.euler_to_matrix((0, 0, 0)), (0, 0, 0)
+    return calc.euler_to_matrix(_vector(origin.get('rpy'))), _vector(origin.get('xyz'))
+
+
+def _joint_samples(joint):
+    """
+    Return the sampled joint values and the maximal error factor of the sampling, or None if the joint is unbounded.
+    Prismatic joints only need their limits because the AABB of a translated box is spanned by its end positions.
+    """
+    joint_type = joint.get('type')
+    limit = joint.find('limit')
+    lower = float(limit.get('lower', 0)) if limit is not None else 0.
+    upper = float(limit.get('upper', 0)) if limit is not None else 0.
+    if joint_type == 'prismatic':
+        return ([lower, upper] if lower < upper else [0.]), 0.
+    if joint_type == 'continuous' or (joint_type == 'revolute' and lower < upper):
+        if joint_type == 'continuous':
+            lower, upper = -pi, pi
+        steps = max(1, ceil((upper - lower) / MAX_ANGLE_STEP))
+        step = (upper - lower) / steps
+        # a corner in distance r of the axis leaves the sampled AABB by at most r * (1 - cos(step / 2))
+        return [lower + i * step for i in range(steps + 1)], 1 - cos(step / 2)
+    if joint_type in ('revolute', 'fixed'):
+        return [0.], 0.
+    return None
+
+
+def swept_aabbs(urdf_path, max_samples=MAX_SAMPLES):
+    """
+    Return {link name: (low, high)} of every link with collision objects. The AABB contains the collision objects in
+    every pose that the joint limits allow. It is None if it could not be determined (mesh that is no STL file,
+    unbounded joint or too many poses).
+    """
+    root = ET.parse(urdf_path).getroot()
+    urdf_directory = os.path.dirname(os.path.abspath(urdf_path))
+    joint_of_child = {joint.find('child').get('link'): joint for joint in root.findall('joint')}
+
+    poses = {}  # link name -> [(transform, [(joint position, error factor) of the movable ancestors])] or None
+
+    def link_poses(name):
+        if name in poses:
+            return poses[name]
+        joint = joint_of_child.get(name)
+        if joint is None:
+            result = [((calc.euler_to_matrix((0, 0, 0)), (0, 0, 0)), [])]
+        else:
+            parent_poses = link_poses(joint.find('parent').get('link'))
+            samples = _joint_samples(joint)
+            if parent_poses is None or samples is None or len(parent_poses) * len(samples[0]) > max_samples:
+                result = None
+            else:
+                values, error_factor = samples
+                axis = _vector(joint.find('axis').get('xyz') if joint.find('axis') is not None else None, (1, 0, 0))
+                result = []
+                for transform, moving_joints in parent_poses:
+                    joint_transform = _compose(transform, _origin(joint))
+                    if len(values) > 1:
+                        moving_joints = moving_joints + [(joint_transform[1], error_factor)]
+                    for value in values:
+                        if joint.get('type') == 'prismatic':
+                            motion = calc.axis_angle_to_matrix(axis, 0), tuple(x * value for x in axis)
+                        else:
+                            motion = calc.axis_angle_to_matrix(axis, value), (0, 0, 0)
+                        result.append((_compose(joint_transform, motion), moving_joints))
+        poses[name] = result
+        return result
+
+    aabbs = {}
+    for link in root.findall('link'):
+        collisions = link.findall('collision')
+        if not collisions:
+            continue
+        name = link.get('name')
+        corners = []
+        for collision in collisions:
+            geometry_corners = _geometry_corners(collision.find('geometry'), urdf_directory)
+            if geometry_corners is None:
+                corners = None
+                break
+            corners.extend(_apply(_origin(collision), corner) for corner in geometry_corners)
+        link_pose_list = link_poses(name)
+        if corners is None or link_pose_list is None:
+            aabbs[name] = None
+            continue
+        low, high = [float('inf')] * 3, [float('-inf')] * 3
+        padding = 0.
+        for transform, moving_joints in link_pose_list:
+            world_corners = [_apply(transform, corner) for corner in corners]
+            for corner in world_corners:
+                low = [min(a, b) for a, b in zip(low, corner)]
+                high = [max(a, b) for a, b in zip(high, corner)]
+            # the errors of all sampled revolute joints of a chain add up
+            padding = max(padding, sum(error_factor * max(dist(position, c) for c in world_corners)
+                                       for position, error_factor in moving_joints))
+        aabbs[name] = (tuple(x - padding for x in low), tuple(x + padding for x in high))
+    return aabbs
+
+
+def never_colliding_pairs(urdf_path, margin=MARGIN):
+    """Return the sorted (link1, link2) pairs whose swept AABBs are further apart than margin."""
+    aabbs = swept_aabbs(urdf_path)
+    pairs = []
+    for link1, link2 in combinations(sorted(aabbs), 2):
+        if aabbs[link1] is None or aabbs[link2] is None:
+            continue
+        (low1, high1), (low2, high2) = aabbs[link1], aabbs[link2]
+        if any(low1[i] > high2[i] + margin or low2[i] > high1[i] + margin for i in range(3)):
+            pairs.append((link1, link2))
+    return pairs
+
+
+def disable_collisions_xml(link1, link2):
+    return '    <disable_collisions link1="' + link1 + '" link2="' + link2 + '" reason="Never"/>\n\n'
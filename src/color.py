@@ -1,9 +1,22 @@
-import bpy
+try:
+    import bpy
+except ImportError:
+    bpy = None  # outside of Blender (see urdf_world.py) a material only needs a name and a color
+
+
+class Material:
+    """Stand-in for a Blender material that holds everything needed to export it to URDF."""
+    def __init__(self, name, diffuse_color):
+        self.name = name
+        self.diffuse_color = diffuse_color
 
 
 def new_color_material(rgba_tuple, name="rgba_color"):
+    if not bpy:
+        return Material(name, rgba_tuple)
     color = bpy.data.materials.new(name)
     color.diffuse_color = rgba_tuple
+    color.use_fake_user = True  # BlenderWorld.reset() removes materials without users
     return color
 
 
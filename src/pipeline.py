@@ -0,0 +1,264 @@
+"""
+Generate, verify and render many puzzles with overlapping stages:
+
+    seeds -> generate (batch_worker.py processes) -> solve (SolverWorkers) -> render (background Blender processes)
+
+Every stage has its own workers and a bounded input queue. A stage blocks while the queue of the next stage is full,
+so a slow stage slows the stages before it down instead of piling up puzzles in memory (backpressure).
+"""
+import os
+import sys
+import json
+import time
+import traceback
+from queue import Queue
+from threading import Thread, Lock
+from subprocess import Popen, PIPE, DEVNULL
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(DIR)
+from pybullet_simulation import SolverWorker
+
+_DONE = None  # passed through the queues after the last puzzle
+GENERATOR_RESPONSE_PREFIX = "batch_worker response: "  # RESPONSE_PREFIX of batch_worker.py
+
+
+class Stage:
+    """Worker threads that process the items of a bounded input queue and pass them to the next stage."""
+    def __init__(self, name, function, workers, queue_size):
+        self.name = name
+        self.function = function  # function(worker_index, item) -> item
+        self.workers = workers
+        self.queue = Queue(queue_size)
+        self.next_stage = None
+        self.threads = []
+        self.lock = Lock()
+        self.processed = 0
+        self.busy_time = 0.
+        self.begin = None
+        self.end = None
+        self.results = []  # items that left the last stage
+        self.on_result = None  # called with every item that leaves the last stage
+
+    def start(self):
+        self.begin = time.time()
+        self.threads = [Thread(target=self._work, args=(i,), daemon=True) for i in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def _work(self, worker_index):
+        while True:
+            item = self.queue.get()
+            if item is _DONE:
+                return
+            begin = time.time()
+            try:
+                item = self.function(worker_index, item)
+            except Exception as e:
+                # the item fails instead of the worker, a stage without workers would block the pipeline forever
+                traceback.print_exc()
+                item = self._failed(item, e)
+            with self.lock:
+                self.processed += 1
+                self.busy_time += time.time() - begin
+            if self.next_stage:
+                self.next_stage.queue.put(item)  # blocks while the next stage is busy
+            else:
+                with self.lock:
+                    self.results.append(item)
+                    if self.on_result:
+                        try:
+                            self.on_result(item)
+                        except Exception:
+                            traceback.print_exc()
+
+    def _failed(self, item, exception):
+        """
+        Return the result of an item (a seed or the result of the previous stage) whose processing raised. It counts as
+        crashed like a puzzle whose generator crashed, because the cause (e.g. a missing file) is not the puzzle.
+        """
+        result = dict(item) if isinstance(item, dict) else {"seed": item}
+        result.setdefault("renders", [])
+        result["returncode"] = 1
+        result["crashed"] = True
+        result["error"] = self.name + " failed: " + repr(exception)
+        return result
+
+    def finish(self):
+        """Wait until all items are processed (the input must have been completed with finish_input())."""
+        for thread in self.threads:
+            thread.join()
+        self.end = time.time()
+
+    def finish_input(self):
+        for _ in range(self.workers):
+            self.queue.put(_DONE)
+
+    def report(self):
+        elapsed = (self.end or time.time()) - self.begin
+        throughput = self.processed / elapsed if elapsed else 0.
+        utilization = self.busy_time / (elapsed * self.workers) if elapsed else 0.
+        print("{:>8}: {} puzzles in {:.1f} s ({:.2f} puzzles/s, {} workers {:.0%} busy)".format(
+            self.name, self.processed, elapsed, throughput, self.workers, utilization))
+
+
+class BatchWorker:
+    """
+    Long-lived generator process (batch_worker.py). It is restarted after it crashed and replaced by a fresh process
+    after max_builds builds or as soon as its resident memory exceeds max_rss bytes, so a long batch does not depend
+    on one Blender process surviving (or leaking memory).
+    """
+    def __init__(self, command, max_builds=None, max_rss=None):
+        self.command = command
+        self.max_builds = max_builds
+        self.max_rss = max_rss
+        self.process = None
+        self.builds = 0
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.process = Popen(self.command, stdin=PIPE, stdout=PIPE, text=True)
+        self.builds = 0
+
+    def request(self, request: dict) -> dict:
+        if self.is_alive() and self.max_builds and self.builds >= self.max_builds:
+            self.close()
+        if not self.is_alive():
+            self.start()
+        self.builds += 1
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+            line = self.process.stdout.readline()
+            while line and not line.startswith(GENERATOR_RESPONSE_PREFIX):
+                sys.stderr.write(line)  # printed by Blender before batch_worker.py took over stdout (e.g. the banner)
+                line = self.process.stdout.readline()
+        except BrokenPipeError:
+            line = ""
+        if not line:
+            # the generator crashed (e.g. inside Blender), it will be restarted with the next request
+            returncode = self.process.wait()
+            self.process = None
+            return {"seed": request["seed"], "name": request["puzzle_name"], "returncode": 1, "crashed": True,
+                    "error": "generator exited with code " + str(returncode), "renders": []}
+        response = json.loads(line[len(GENERATOR_RESPONSE_PREFIX):])
+        if self.max_rss and "memory" in response and response["memory"]["rss"] > self.max_rss:
+            self.close()  # recycled, the next request starts a fresh process
+        return response
+
+    def close(self):
+        if self.is_alive():
+            self.process.stdin.close()
+            self.process.wait()
+        self.process = None
+
+
+class Pipeline:
+    """
+    Build puzzles of one sampler for a range of seeds.
+
+    Args:
+        sampler: name of a sampler class in sampling.py, e.g. "GridWorldSampler"
+        world: "UrdfWorld" (plain Python) or "BlenderWorld" (every generator runs in its own Blender process)
+        verify: test solvability of every generated puzzle (adds "solved" to the result or "crashed" and "error" if
+            the solver failed)
+        render: render the images of BlenderWorld puzzles in the render stage instead of the generator
+        output_directory: move finished puzzles from dir_for_output (the staging directory) into this directory
+        max_builds_per_generator: replace every generator process after this many builds (None: never)
+        max_generator_rss: replace a generator process when its resident memory exceeds this many bytes (None: never)
+        on_result: called with every result that leaves the pipeline (one call at a time, from the worker threads)
+    """
+    def __init__(self, sampler, sampler_config, world_config, world="UrdfWorld", generators=2, solvers=2,
+                 renderers=1, queue_size=4, verify=True, render=True, planning_time=5., blender="blender",
+                 name_prefix=None, output_directory=None, max_builds_per_generator=None, max_generator_rss=None,
+                 on_result=None):
+        self.sampler = sampler
+        self.sampler_config = sampler_config
+        self.world_config = world_config
+        self.world = world
+        self.verify = verify
+        self.render = render and world == "BlenderWorld"
+        self.planning_time = planning_time
+        self.blender = blender
+        self.name_prefix = name_prefix if name_prefix is not None else sampler.lower()
+        self.output_directory = output_directory
+        self.generators = [BatchWorker(self._generator_command(), max_builds_per_generator, max_generator_rss)
+                           for _ in range(generators)]
+        self.solver_workers = [SolverWorker() for _ in range(solvers)]
+
+        self.stages = [Stage("generate", self._generate, generators, queue_size)]
+        if verify:
+            self.stages.append(Stage("solve", self._solve, solvers, queue_size))
+        if self.render:
+            self.stages.append(Stage("render", self._render, renderers, queue_size))
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+        self.stages[-1].on_result = on_result
+
+    def _generator_command(self):
+        if self.world == "BlenderWorld":
+            return [self.blender, "-b", "-P", DIR + "/batch_worker.py"]
+        return [sys.executable, DIR + "/batch_worker.py"]
+
+    def _generate(self, worker_index, seed):
+        request = {"world": self.world, "world_config": self.world_config, "sampler": self.sampler,
+                   "sampler_config": self.sampler_config, "seed": seed,
+                   "puzzle_name": self.name_prefix + "_" + str(seed), "defer_renders": self.render}
+        if self.output_directory is not None:
+            request["output_directory"] = os.path.abspath(self.output_directory)
+        return self.generators[worker_index].request(request)
+
+    def _solve(self, worker_index, puzzle):
+        if puzzle["returncode"] == 0:
+            with open(puzzle["problem_path"], 'r') as f:
+                problem = json.load(f)
+            response = self.solver_workers[worker_index].request({
+                "urdf_path": problem["urdf_path"],
+                "start_state": problem["start_state"],
+                "goal_space": problem["goal_space"],
+                "allowed_planning_time": self.planning_time,
+                "planner": "RRTConnect",
+                "have_exact_solution": True,
+                "only_check_start_state_validity": False,
+            })
+            if "error" in response:
+                # the solver crashed, so the solvability is unknown (not recorded, see batch_generator.py)
+                puzzle["crashed"] = True
+                puzzle["error"] = "solver failed: " + response["error"]
+            else:
+                puzzle["solved"] = response["returncode"] == 0
+        return puzzle
+
+    def _render(self, worker_index, puzzle):
+        for render in puzzle["renders"]:
+            args = {key: value for key, value in render.items() if key != "snapshot"}
+            returncode = Popen([self.blender, "-b", render["snapshot"], "-P", DIR + "/render_worker.py", "--",
+                                json.dumps(args)], stdout=DEVNULL).wait()
+            if returncode != 0:
+                print("render worker failed to render", puzzle.get("name"))
+            os.remove(render["snapshot"])
+        return puzzle
+
+    def run(self, seeds):
+        """Build a puzzle for every seed. Returns the results (one dict per seed, in order of completion)."""
+        for stage in self.stages:
+            stage.start()
+        try:
+            for seed in seeds:
+                self.stages[0].queue.put(seed)  # blocks while all generators are busy and their queue is full
+            for stage in self.stages:
+                stage.finish_input()
+                stage.finish()
+        finally:
+            for generator in self.generators:
+                generator.close()
+            for worker in self.solver_workers:
+                worker.close()
+        self.report()
+        return self.stages[-1].results
+
+    def report(self):
+        for stage in self.stages:
+            stage.report()
@@ -1,24 +1,414 @@
-from subprocess import run
+import atexit
+import fcntl
+import json
+import os
+import re
+import sys
+import time
+from hashlib import sha256
+from contextlib import contextmanager
+from queue import Queue
+from threading import Lock, Event, get_ident
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from subprocess import run, Popen, PIPE
+
+# the scripts are started by absolute path with this interpreter, so the current directory does not matter
+PYBULLET_OMPL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "pybullet-ompl")
+
+
+class SolverWorker:
+    """
+    Long-lived [pybullet_ompl](https://github.com/lyf44/pybullet_ompl) process (pybullet-ompl/solver_worker.py).
+    OMPL stays imported and the pybullet client stays connected between requests, so a solvability check only costs
+    loading the URDF and planning instead of starting a new interpreter every time.
+    """
+    def __init__(self):
+        self.process = None
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.process = Popen([sys.executable, PYBULLET_OMPL_DIR + "/solver_worker.py"], stdin=PIPE, stdout=PIPE,
+                             text=True)
+
+    def request(self, request: dict) -> dict:
+        """
+        Send a request (see pybullet-ompl/solver_worker.py) and wait for the response. Restart the worker if needed.
+        """
+        if not self.is_alive():
+            self.start()
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+            line = self.process.stdout.readline()
+        except BrokenPipeError:
+            line = ""
+        if not line:
+            # the worker crashed (e.g. inside pybullet), it will be restarted with the next request
+            returncode = self.process.wait()
+            self.process = None
+            return {"returncode": 1, "error": "solver worker exited with code " + str(returncode)}
+        return json.loads(line)
+
+    def close(self):
+        if self.is_alive():
+            self.process.stdin.close()
+            self.process.wait()
+        self.process = None
+
+    def kill(self):
+        """Stop the worker immediately, even while it is planning. It will be restarted with the next request."""
+        process = self.process  # request() may reset it in the meantime (from another thread)
+        if process is not None and process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+_worker = SolverWorker()
+atexit.register(_worker.close)
+
+
+@contextmanager
+def _file_lock(filepath):
+    """Exclusive lock on filepath (created if needed) between all threads and processes that use the same file."""
+    with open(filepath, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_json(filepath, data, **kwargs):
+    """Replace filepath atomically, so other threads and processes never read a half written file."""
+    temporary_path = filepath + "." + str(os.getpid()) + "." + str(get_ident()) + ".tmp"
+    with open(temporary_path, 'w') as f:
+        json.dump(data, f, **kwargs)
+    os.replace(temporary_path, filepath)
+
+
+class ResultCache:
+    """
+    On-disk cache of solvability results, one JSON file per key.
+    The key is the hash of the URDF (without the name of the robot and with referenced meshes replaced by the hash of
+    their content), the start state, the goal space, the planner and the flags of solve() (including collision_mode and
+    prune_pairs).
+    A solution that has been found within some planning time is also reused for larger planning times, a failure is
+    only reused for planning times that are not larger.
+    Entries are updated under a lock file in the directory, so concurrent threads and processes do not lose updates.
+    """
+    LOCK_FILENAME = "store.lock"
+
+    def __init__(self, directory, max_entries=100000, max_age=30 * 24 * 60 * 60):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age = max_age  # in seconds
+        self.stores_until_eviction = 0
+
+    def _hash_file(self, filepath):
+        with open(filepath, 'rb') as f:
+            return sha256(f.read()).hexdigest()
+
+    def _normalized_urdf(self, urdf_path):
+        with open(urdf_path, 'r') as f:
+            urdf = f.read()
+        urdf = re.sub(r'<robot name="[^"]*">', '<robot>', urdf, count=1)
+
+        def mesh_hash(match):
+            filepath = match.group(1)
+            if filepath.startswith("file://"):
+                filepath = filepath[len("file://"):]
+            if not os.path.isabs(filepath):
+                filepath = os.path.join(os.path.dirname(urdf_path), filepath)
+            if os.path.exists(filepath):
+                return '<mesh filename="sha256:' + self._hash_file(filepath) + '"'
+            return match.group(0)
+
+        return re.sub(r'<mesh filename="([^"]*)"', mesh_hash, urdf)
+
+    def key(self, urdf_path, start_state, goal_space, planner, have_exact_solution, only_check_start_state_validity,
+            collision_mode, prune_pairs):
+        content = json.dumps([self._normalized_urdf(urdf_path), list(start_state), goal_space, planner,
+                              have_exact_solution, only_check_start_state_validity, collision_mode, prune_pairs])
+        return sha256(content.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"solved_within": None, "unsolved_within": None}
+
+    def lookup(self, key, allowed_planning_time):
+        """Return the cached return code of solve() or None if the result is unknown for this planning time."""
+        entry = self._read(key)
+        if entry["solved_within"] is not None and allowed_planning_time >= entry["solved_within"]:
+            return 0
+        if entry["unsolved_within"] is not None and allowed_planning_time <= entry["unsolved_within"]:
+            return 1
+        return None
+
+    def store(self, key, allowed_planning_time, returncode):
+        os.makedirs(self.directory, exist_ok=True)
+        with _file_lock(os.path.join(self.directory, self.LOCK_FILENAME)):
+            entry = self._read(key)
+            if returncode == 0:
+                if entry["solved_within"] is None or allowed_planning_time < entry["solved_within"]:
+                    entry["solved_within"] = allowed_planning_time
+            else:
+                if entry["unsolved_within"] is None or allowed_planning_time > entry["unsolved_within"]:
+                    entry["unsolved_within"] = allowed_planning_time
+            _write_json(self._path(key), entry)
+            evict = self.stores_until_eviction == 0
+            if evict:
+                self.stores_until_eviction = 1000
+            self.stores_until_eviction -= 1
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Remove entries that are older than max_age and the oldest entries beyond max_entries."""
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for filename in os.listdir(self.directory):
+            if filename == self.LOCK_FILENAME:
+                continue
+            try:
+                entries.append((os.path.getmtime(os.path.join(self.directory, filename)), filename))
+            except OSError:
+                pass  # removed by another process in the meantime
+        entries.sort(reverse=True)
+        now = time.time()
+        for i, (mtime, filename) in enumerate(entries):
+            if i >= self.max_entries or now - mtime > self.max_age:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+    def clear(self):
+        self.max_entries, max_entries = 0, self.max_entries
+        self.evict()
+        self.max_entries = max_entries
+
+
+# set to None to disable the cache or replace it to use another directory or other limits
+result_cache = ResultCache(os.path.join(os.path.expanduser("~"), ".cache", "puzzle-generator", "solve_results"))
+
+
+class PlannerWins:
+    """
+    How often each planner has won a portfolio race (see solve_portfolio()), per puzzle family, stored as JSON:
+    {family: {planner: wins}}.
+    The counts are re-read and updated under a lock file next to the JSON file, so concurrent threads and processes
+    (e.g. pipeline solvers and batch workers) do not overwrite each other's wins.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+    def read(self):
+        try:
+            with open(self.filepath, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, family, planner):
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        with _file_lock(self.filepath + ".lock"):
+            wins = self.read()
+            family_wins = wins.setdefault(family, {})
+            family_wins[planner] = family_wins.get(planner, 0) + 1
+            _write_json(self.filepath, wins, indent=4)
+
+    def ranked(self, family, planners):
+        """Return the planners sorted by their wins within the family (most wins first, otherwise in given order)."""
+        family_wins = self.read().get(family, {})
+        return sorted(planners, key=lambda planner: -family_wins.get(planner, 0))
+
+
+# set to None to stop recording the winners of solve_portfolio() or replace it to use another file
+planner_wins = PlannerWins(os.path.join(os.path.expanduser("~"), ".cache", "puzzle-generator", "planner_wins.json"))
+
+
+class SolverPool:
+    """
+    Several SolverWorkers that test the solvability of different puzzles concurrently.
+    Tests whose results are not needed anymore can be stopped with stop(), so they do not keep workers busy.
+    """
+    def __init__(self, size):
+        self.all_workers = [SolverWorker() for _ in range(size)]
+        self.workers = Queue()  # workers that are not busy
+        for worker in self.all_workers:
+            self.workers.put(worker)
+        self.executor = ThreadPoolExecutor(size)
+        self.lock = Lock()
+        self.running = {}  # worker -> stop event of the test that it is running
+
+    def _solve(self, stop, *args, **kwargs):
+        worker = self.workers.get()
+        try:
+            with self.lock:
+                if stop.is_set():
+                    return None
+                self.running[worker] = stop
+            return solve(*args, verbose=False, worker=worker, **kwargs)
+        finally:
+            with self.lock:
+                self.running.pop(worker, None)
+            self.workers.put(worker)
+
+    def _submit(self, stop, urdf_path, start_state, goal_space, allowed_planning_time=5., planner="RRTConnect",
+                have_exact_solution=True, only_check_start_state_validity=False, collision_mode="pairwise",
+                prune_pairs=False):
+        return self.executor.submit(self._solve, stop, urdf_path, list(start_state), list(goal_space),
+                                    allowed_planning_time, planner=planner, have_exact_solution=have_exact_solution,
+                                    only_check_start_state_validity=only_check_start_state_validity,
+                                    collision_mode=collision_mode, prune_pairs=prune_pairs)
+
+    def submit(self, *args, **kwargs):
+        """
+        Test solvability with the next free worker (arguments like solve()). Returns a Future of the return code of
+        solve() (None if the test has been stopped).
+        """
+        stop = Event()
+        future = self._submit(stop, *args, **kwargs)
+        future.stop = stop
+        return future
+
+    def submit_after(self, future, condition, *args, **kwargs):
+        """
+        Like submit(), but the test only starts when the future (of submit() or submit_after()) is done and only if
+        condition(its result) is true. Returns a Future of the return code of solve() or of None if the test has not
+        been run.
+        """
+        chained = Future()
+        chained.set_running_or_notify_cancel()  # it can only be stopped with stop(), not cancelled
+        chained.stop = Event()
+
+        def set_result(test):
+            if test.cancelled():
+                chained.set_result(None)
+            elif test.exception() is not None:
+                chained.set_exception(test.exception())
+            else:
+                chained.set_result(test.result())
+
+        def submit(done):
+            if done.cancelled() or done.exception() is not None or chained.stop.is_set() or \
+                    not condition(done.result()):
+                chained.set_result(None)
+            else:
+                self._submit(chained.stop, *args, **kwargs).add_done_callback(set_result)
+
+        future.add_done_callback(submit)
+        return chained
+
+    def stop(self, futures):
+        """
+        Stop the tests of the futures (of submit() or submit_after()): waiting tests are dropped and workers that are
+        still running one of them are killed (they are restarted with their next test).
+        """
+        for future in futures:
+            future.stop.set()  # first, so that no stopped test starts the test that is chained to it
+        for future in futures:
+            future.cancel()
+        with self.lock:
+            for worker, stop in self.running.items():
+                if stop.is_set():
+                    worker.kill()
+
+    def _request(self, request):
+        worker = self.workers.get()
+        try:
+            return worker.request(request)
+        finally:
+            self.workers.put(worker)
+
+    def submit_request(self, request: dict):
+        """Send a raw request (see pybullet-ompl/solver_worker.py) to the next free worker. Returns a Future."""
+        return self.executor.submit(self._request, request)
+
+    def close(self):
+        """Cancel all pending requests and stop all workers (also the ones that are still planning)."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for worker in self.all_workers:
+            worker.kill()
 
 
 def solve(urdf_path, start_state, goal_space, allowed_planning_time=5., show_gui=False, planner="RRTConnect",
-          have_exact_solution=True, verbose=True, only_check_start_state_validity=False):
-    """Test solvability with [pybullet_ompl](https://github.com/lyf44/pybullet_ompl) as a subprocess."""
-    start_state = str(start_state)
-    goal_space = str(goal_space)
+          have_exact_solution=True, verbose=True, only_check_start_state_validity=False, persistent_worker=True,
+          worker=None, use_cache=True, collision_mode="pairwise", save_certificate=False, prune_pairs=False):
+    """
+    Test solvability with [pybullet_ompl](https://github.com/lyf44/pybullet_ompl).
+    Without GUI the request is sent to a persistent SolverWorker (the given one or a shared one), otherwise (or if
+    persistent_worker=False) pybullet_ompl is started as a subprocess.
+    Without GUI, results are looked up in and added to result_cache (if use_cache=True).
+    collision_mode="batched" finds the colliding link pairs of a state with a single collision detection in pybullet
+    (faster for puzzles with many links), "incremental" only queries the pairs that moved since the last checked state
+    and the default "pairwise" queries every pair separately.
+    With prune_pairs=True the link pairs that can never collide (see collision_matrix.py) are not checked.
+    With save_certificate=True a found solution is saved as path certificate next to the URDF (see
+    certificate_path() and verify_certificate()). Cached results are not used then.
+    """
     if verbose:
         if only_check_start_state_validity:
-            print("starting subprocess pybullet_ompl to check start state validity")
+            print("starting pybullet_ompl to check start state validity")
         else:
-            print("starting subprocess pybullet_ompl to test solvability")
+            print("starting pybullet_ompl to test solvability")
         print("input:", urdf_path)
         print("start state:", start_state)
         print("goal space:", goal_space)
-    result = run(["python3", "pybullet-ompl/pybullet_ompl.py", urdf_path, start_state, goal_space,
-                  str(allowed_planning_time), str(show_gui), planner, str(have_exact_solution),
-                  str(only_check_start_state_validity)]).returncode
+    result = None
+    cache_key = None
+    # the validity of the start state does not depend on the planning time
+    cache_time = 0. if only_check_start_state_validity else allowed_planning_time
+    if use_cache and result_cache and not show_gui:
+        cache_key = result_cache.key(urdf_path, start_state, goal_space, planner, have_exact_solution,
+                                     only_check_start_state_validity, collision_mode, prune_pairs)
+        if not save_certificate:
+            result = result_cache.lookup(cache_key, cache_time)
+    if result is not None:
+        if verbose:
+            print("using cached result")
+    elif persistent_worker and not show_gui:
+        if worker is None:
+            worker = _worker
+        request = {
+            "urdf_path": urdf_path,
+            "start_state": list(start_state),
+            "goal_space": goal_space,
+            "allowed_planning_time": allowed_planning_time,
+            "planner": planner,
+            "have_exact_solution": have_exact_solution,
+            "only_check_start_state_validity": only_check_start_state_validity,
+            "collision_mode": collision_mode,
+            "prune_pairs": prune_pairs,
+        }
+        if save_certificate:
+            request["save_certificate"] = certificate_path(urdf_path)
+        response = worker.request(request)
+        result = response["returncode"]
+        if verbose and "states_per_second" in response:
+            print("states per second:", round(response["states_per_second"]))
+            if collision_mode == "incremental":
+                print("reused pair verdicts:", response["pair_cache_hits"], "queried:", response["pair_cache_misses"])
+        if cache_key and "error" not in response:
+            result_cache.store(cache_key, cache_time, result)
+    else:
+        result = run([sys.executable, PYBULLET_OMPL_DIR + "/pybullet_ompl.py", urdf_path, str(start_state),
+                      str(goal_space), str(allowed_planning_time), str(show_gui), planner, str(have_exact_solution),
+                      str(only_check_start_state_validity), "False", collision_mode,
+                      certificate_path(urdf_path) if save_certificate else "", str(prune_pairs)]).returncode
+        if cache_key and result in (0, 1):  # other return codes mean that pybullet_ompl crashed
+            result_cache.store(cache_key, cache_time, result)
     if verbose:
-        print("returned from subprocess")
+        print("returned from pybullet_ompl")
         if result == 0:
             if have_exact_solution:
                 print("FOUND EXACT SOLUTION!")
@@ -30,3 +420,160 @@ def solve(urdf_path, start_state, goal_space, allowed_planning_time=5., show_gui
             else:
                 print("NO SOLUTION FOUND!")
     return result
+
+
+def certificate_path(urdf_path):
+    """Return the filepath of the path certificate of a puzzle (next to its URDF)."""
+    return os.path.splitext(urdf_path)[0] + ".path"
+
+
+def verify_certificate(urdf_path, start_state=None, goal_space=None, certificate=None, worker=None, verbose=True,
+                       collision_mode="pairwise"):
+    """
+    Re-confirm the solvability of a puzzle without planning: replay its stored solution path (see solve() with
+    save_certificate=True) through the collision checker. If start state and goal space are given, the certificate
+    must belong to them. Returns 0 if the certificate is valid, else 1 (also if there is no certificate).
+    """
+    if certificate is None:
+        certificate = certificate_path(urdf_path)
+    if not os.path.exists(certificate):
+        if verbose:
+            print("no path certificate:", certificate)
+        return 1
+    if worker is None:
+        worker = _worker
+    response = worker.request({
+        "urdf_path": urdf_path,
+        "verify_certificate": certificate,
+        "start_state": None if start_state is None else list(start_state),
+        "goal_space": goal_space,
+        "collision_mode": collision_mode,
+    })
+    if verbose:
+        if response["returncode"] == 0:
+            print("VALID PATH CERTIFICATE! (verified in", round(response["verification_time"], 4), "s)")
+        else:
+            print("INVALID PATH CERTIFICATE!", response.get("error", ""))
+    return response["returncode"]
+
+
+def compare_state_validity(urdf_path, other_urdf_path=None, collision_mode="pairwise",
+                           other_collision_mode="pairwise", samples=1000, seed=0, worker=None, verbose=True,
+                           prune_pairs=False, other_prune_pairs=False):
+    """
+    Check the same random states (within the joint limits of urdf_path) with both URDFs and collision modes, e.g. the
+    batched and the pairwise mode, pruned and all link pairs or a puzzle with merged static geometry and the same
+    puzzle without. The joints are matched by name. Returns the states of urdf_path whose verdicts differ (an empty
+    list if they are equivalent).
+    """
+    if other_urdf_path is None:
+        other_urdf_path = urdf_path
+    if worker is None:
+        worker = _worker
+    response = worker.request({"urdf_path": urdf_path, "check_states": samples, "seed": seed,
+                               "collision_mode": collision_mode, "prune_pairs": prune_pairs})
+    if "error" in response:
+        raise RuntimeError("could not check the states of " + urdf_path + ": " + response["error"])
+    other_request = {"urdf_path": other_urdf_path, "check_states": [], "collision_mode": other_collision_mode,
+                     "prune_pairs": other_prune_pairs}
+    other_response = worker.request(other_request)
+    if "error" in other_response or sorted(other_response["joint_names"]) != sorted(response["joint_names"]):
+        raise RuntimeError("the joints of " + other_urdf_path + " do not match the joints of " + urdf_path)
+    order = [response["joint_names"].index(name) for name in other_response["joint_names"]]
+    other_request["check_states"] = [[state[i] for i in order] for state in response["states"]]
+    other_response = worker.request(other_request)
+    different = [state for state, valid, other_valid in zip(response["states"], response["valid"],
+                                                            other_response["valid"]) if valid != other_valid]
+    if verbose:
+        print("valid states:", sum(response["valid"]), "(" + collision_mode + ")", sum(other_response["valid"]),
+              "(" + other_collision_mode + ") of", samples, "-", len(different), "different verdicts")
+    return different
+
+
+DEFAULT_PORTFOLIO = ("RRTConnect", "KPIECE1", "BITstar", "EST")
+
+# one persistent worker per planner of the portfolio
+_portfolio_workers = []
+
+
+def _close_portfolio_workers():
+    for worker in _portfolio_workers:
+        worker.close()
+
+
+atexit.register(_close_portfolio_workers)
+
+
+def solve_portfolio(urdf_path, start_state, goal_space, allowed_planning_time=5., planners=DEFAULT_PORTFOLIO,
+                    family=None, size=None, verbose=True, use_cache=True, collision_mode="pairwise",
+                    prune_pairs=False):
+    """
+    Race several planners (any planner that PbOMPL.set_planner() supports) on the same problem, each in its own
+    SolverWorker. Returns 0 as soon as one of them finds an exact solution (the others are killed) or 1 if none of
+    them finds one within allowed_planning_time.
+    The winner is recorded in planner_wins for the family (e.g. the name of the sampler). With a family and a size,
+    only the size planners that won most often in this family race.
+    """
+    if family and planner_wins:
+        planners = planner_wins.ranked(family, planners)
+    if size:
+        planners = planners[:size]
+    planners = list(planners)
+    if verbose:
+        print("starting pybullet_ompl portfolio", planners, "to test solvability")
+        print("input:", urdf_path)
+
+    cache_key = None
+    if use_cache and result_cache:
+        cache_key = result_cache.key(urdf_path, start_state, goal_space, "portfolio:" + ",".join(sorted(planners)),
+                                     True, False, collision_mode, prune_pairs)
+        result = result_cache.lookup(cache_key, allowed_planning_time)
+        if result is not None:
+            if verbose:
+                print("using cached result:", "FOUND EXACT SOLUTION!" if result == 0 else "NO EXACT SOLUTION FOUND!")
+            return result
+
+    while len(_portfolio_workers) < len(planners):
+        _portfolio_workers.append(SolverWorker())
+    workers = _portfolio_workers[:len(planners)]
+
+    def race(worker, planner):
+        return worker.request({
+            "urdf_path": urdf_path,
+            "start_state": list(start_state),
+            "goal_space": goal_space,
+            "allowed_planning_time": allowed_planning_time,
+            "planner": planner,
+            "have_exact_solution": True,
+            "only_check_start_state_validity": False,
+            "collision_mode": collision_mode,
+            "prune_pairs": prune_pairs,
+        })
+
+    winner = None
+    errors = 0
+    with ThreadPoolExecutor(len(planners)) as executor:
+        pending = {executor.submit(race, worker, planner): planner for worker, planner in zip(workers, planners)}
+        while pending and winner is None:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                planner = pending.pop(future)
+                response = future.result()
+                if response["returncode"] == 0 and winner is None:
+                    winner = planner
+                elif "error" in response:
+                    errors += 1
+        for future, planner in pending.items():
+            workers[planners.index(planner)].kill()  # stop the losers, they restart with their next request
+
+    result = 0 if winner else 1
+    if cache_key and (winner or not errors):
+        result_cache.store(cache_key, allowed_planning_time, result)
+    if winner and family and planner_wins:
+        planner_wins.record(family, winner)
+    if verbose:
+        if winner:
+            print("FOUND EXACT SOLUTION! (" + winner + " won)")
+        else:
+            print("NO EXACT SOLUTION FOUND!")
+    return result
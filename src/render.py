@@ -0,0 +1,26 @@
+import bpy
+
+
+def render_view(filepath, location=(30, 0, 20), rotation=(0.96, 0, 1.5708), focal_length=90, camera=None,
+                excluded_objects=()):
+    """
+    Render the scene from the given camera pose (zoomed in on all objects except the excluded objects).
+    Reuses the given camera or creates a new one. Returns the camera.
+    """
+    if camera is None:
+        bpy.ops.object.camera_add(location=location, rotation=rotation)
+        camera = bpy.context.object
+    camera.location = location
+    camera.rotation_euler = rotation
+    camera.data.lens = focal_length + 10
+    bpy.context.scene.camera = camera
+
+    bpy.ops.object.select_all(action='SELECT')
+    for name in excluded_objects:
+        bpy.data.objects[name].select_set(False)
+    bpy.ops.view3d.camera_to_view_selected()
+
+    camera.data.lens = focal_length
+    bpy.context.scene.render.filepath = filepath
+    bpy.ops.render.render(write_still=True)
+    return camera
@@ -0,0 +1,29 @@
+"""
+Render views of a scene snapshot in a headless Blender process (see BlenderWorld.render_images()):
+
+    blender -b snapshot.blend -P src/render_worker.py -- '{"views": [[filepath, location, rotation]], ...}'
+
+If "render_keys_path" and "render_keys" are given, the keys of the rendered images are added to that file afterwards.
+"""
+import os
+import sys
+import json
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(DIR)
+from render import render_view
+
+args = json.loads(sys.argv[sys.argv.index("--") + 1])
+camera = None
+for filepath, location, rotation in args["views"]:
+    camera = render_view(filepath, location, rotation, args["focal_length"], camera, args["excluded_objects"])
+
+if "render_keys_path" in args:
+    keys = {}
+    if os.path.exists(args["render_keys_path"]):
+        with open(args["render_keys_path"], 'r') as f:
+            keys = json.load(f)
+    keys.update(args["render_keys"])
+    os.makedirs(os.path.dirname(args["render_keys_path"]), exist_ok=True)
+    with open(args["render_keys_path"], 'w') as f:
+        json.dump(keys, f, indent=1)
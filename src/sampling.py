@@ -1,11 +1,15 @@
-from random import seed, random, choice, shuffle
+import random
+from itertools import permutations, islice
+from collections import deque
 import os
 import sys
+import json
+import shutil
 
 DIR = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(DIR)
 from world import BlenderWorld
-from pybullet_simulation import solve
+from pybullet_simulation import solve, solve_portfolio, SolverPool
 import calc
 import color
 
@@ -19,7 +23,12 @@ class PuzzleSampler:
         self.number_revolute_joints = config["number_revolute_joints"]
         self.total_number_joints = self.number_prismatic_joints + self.number_revolute_joints
         self.attempts = config["attempts"]
-        seed(config["seed_for_randomness"])
+        if config["seed_for_randomness"] is None:
+            self.seed = random.SystemRandom().randrange(2 ** 32)  # pseudorandom, but still printed and reproducible
+            print("seed_for_randomness:", self.seed)
+        else:
+            self.seed = config["seed_for_randomness"]
+        self.random = random.Random(self.seed)  # all samplers draw from their own generator, never from the global one
         self.create_handle = config["create_handle"]
         self.prismatic_joints_target = self.number_prismatic_joints
         self.revolute_joints_target = self.number_revolute_joints
@@ -29,10 +38,40 @@ class PuzzleSampler:
         self.goal_adjustment = 0.  # e.g. 0.0001
         self.start_state = []
         self.goal_space = []
+        self.metadata = {}  # saved with the problem, e.g. a difficulty label
 
     def build(self):
         raise NotImplementedError
 
+    def substream(self, *keys):
+        """
+        Return a new random generator that only depends on the seed and the keys, e.g. substream("attempt", 3).
+        A part of the puzzle (an attempt, a link, ...) that draws from its own substream is reproduced exactly without
+        replaying the random numbers that were drawn before it.
+        """
+        return random.Random("/".join(str(key) for key in (self.seed,) + keys))
+
+    def save_problem(self, filepath=None, urdf_path=None):
+        """
+        Save name, URDF path, start state and goal space of the built puzzle as JSON (e.g. for benchmark.py).
+        By default the file is saved in the directory of the puzzle. Returns the filepath.
+        urdf_path overrides the saved URDF path (if the puzzle directory is moved afterwards).
+        """
+        if filepath is None:
+            filepath = self.world.directory + "/problem.json"
+        if urdf_path is None:
+            urdf_path = self.world.urdf_path
+        problem = {
+            "name": self.world.name,
+            "urdf_path": os.path.abspath(urdf_path),
+            "start_state": list(self.start_state),
+            "goal_space": [list(limits) for limits in self.goal_space],
+            "metadata": self.metadata,
+        }
+        with open(filepath, "w") as f:
+            json.dump(problem, f, indent=4)
+        return filepath
+
     def goal_space_append_with_adjustment(self, limits: tuple):
         if len(limits) != 2:
             print("goal_space_append_with_adjustment(): INPUT TUPLE LENGTH IS NOT 2")
@@ -134,9 +173,6 @@ class GridWorldSampler(PuzzleSampler):
         self.epsilon = config["epsilon"]
         self.branching_per_revolute_joint = config["branching_per_revolute_joint"]
         self.branching_factor = config["branching_factor_target"]
-        self.branching_target = self.branching_factor
-        self.start_points = [(0.5, 0.5)]
-        self.occupied_fields = self.start_points.copy()
         self.position_sequence = []
         self.blender_operations_queue = []
         self.fields_to_occupy = {
@@ -178,52 +214,232 @@ class GridWorldSampler(PuzzleSampler):
             "W_clockwise":          ((-1, 0), 0, -calc.RAD90),
         }
 
-    def available(self, direction):
-        """
-        Return True if all fields in the given direction are available.
-        Assume self.start_points[0] as current position!
-        """
-        fields = self.fields_to_occupy[direction]
-        for field in fields:
-            if calc.tuple_add(self.start_points[0], field) in self.occupied_fields:
+    def available(self, direction, start_point, occupied_fields):
+        """Return True if all fields in the given direction (starting at start_point) are available."""
+        for field in self.fields_to_occupy[direction]:
+            if calc.tuple_add(start_point, field) in occupied_fields:
                 return False
         return True
 
-    def occupy(self, direction):
+    def occupy(self, direction, start_point, occupied_fields):
+        """Return occupied_fields extended by newly occupied fields in the given direction."""
+        return occupied_fields.union(calc.tuple_add(start_point, field) for field in self.fields_to_occupy[direction])
+
+    def _new_start_points_options(self, direction, start_point, branching_target):
         """
-        Extend self.occupied_fields by newly occupied fields in the given direction.
-        Assume self.start_points[0] as current position!
+        Return all possible (new_start_points, branching_target) after placing a link in the given direction.
+        The first new start point will be the next one to be used, the others are additional branches.
         """
-        fields = self.fields_to_occupy[direction]
-        for field in fields:
-            self.occupied_fields.append(calc.tuple_add(self.start_points[0], field))
+        if len(direction) == 1:  # prismatic
+            return [((calc.tuple_add(start_point, self.fields_to_occupy[direction][-1]),), branching_target)]
+        # revolute
+        new_start_points_amount = 1 + self.branching_per_revolute_joint
+        direction_fields = self.fields_to_occupy[direction][-new_start_points_amount:]
+        new_start_points = [calc.tuple_add(start_point, df) for df in direction_fields]
+        branches = min(branching_target, len(new_start_points) - 1)
+        options = set()
+        for first in new_start_points:
+            others = [point for point in new_start_points if point != first]
+            for additional in permutations(others, branches):
+                options.add(((first,) + additional, branching_target - branches))
+        options = list(options)
+        self.random.shuffle(options)
+        return options
+
+    def _positions(self, prismatic: bool):
+        if prismatic:
+            return ["N", "E", "S", "W"]
+        if self.allow_clockwise:
+            return ["N_counterclockwise", "N_clockwise",
+                    "E_counterclockwise", "E_clockwise",
+                    "S_counterclockwise", "S_clockwise",
+                    "W_counterclockwise", "W_clockwise"]
+        return ["N_counterclockwise",
+                "E_counterclockwise",
+                "S_counterclockwise",
+                "W_counterclockwise"]
+
+    def _disjoint_placements(self, start_points, occupied_fields, prismatic_target, revolute_target):
+        """
+        Yield every list of (direction, start_point) placements (one for each start point) so that no two placements
+        occupy the same field and at most prismatic_target prismatic and revolute_target revolute joints are used.
+        Yield nothing if that is impossible.
+        """
+        remaining_positions = []
+        if prismatic_target:
+            remaining_positions += self._positions(prismatic=True)
+        if revolute_target:
+            remaining_positions += self._positions(prismatic=False)
+        options = []
+        for i, start_point in enumerate(start_points):
+            directions = [d for d in remaining_positions if self.available(d, start_point, occupied_fields)]
+            if not directions:
+                return
+            self.random.shuffle(directions)
+            options.append((i, start_point, directions))
+        options.sort(key=lambda option: len(option[2]))  # most constrained start points first
+
+        chosen = [None] * len(start_points)
+
+        def assign(k, occupied, prismatic_left, revolute_left):
+            if k == len(options):
+                yield list(chosen)
+                return
+            i, start_point, directions = options[k]
+            for direction in directions:
+                prismatic = len(direction) == 1
+                if prismatic and prismatic_left == 0 or not prismatic and revolute_left == 0:
+                    continue
+                if not self.available(direction, start_point, occupied):
+                    continue
+                chosen[i] = (direction, start_point)
+                if prismatic:
+                    left = prismatic_left - 1, revolute_left
+                else:
+                    left = prismatic_left, revolute_left - 1
+                yield from assign(k + 1, self.occupy(direction, start_point, occupied), *left)
+
+        yield from assign(0, occupied_fields, prismatic_target, revolute_target)
 
-    def _add_new_start_points(self, direction):
+    def _search(self, start_points, occupied_fields, branching_target, prismatic_target, revolute_target,
+                failed_states):
+        """
+        Depth-first search for sequences of (direction, start_point) placements that place all joints.
+        Yields the sequences one after another (the search goes on where it stopped when the next one is requested),
+        so a sequence that is rejected afterwards is replaced by backtracking. States that can not be completed are
+        remembered in failed_states.
+        """
+        if prismatic_target == 0 and revolute_target == 0:
+            yield []
+            return
+        state = (start_points, occupied_fields, branching_target, prismatic_target, revolute_target)
+        if state in failed_states:
+            return
+
+        # fields only get occupied, so every start point that will be used (the next prismatic_target +
+        # revolute_target ones) needs its own placement that does not overlap with the placements of the others
+        remaining = prismatic_target + revolute_target
+        all_placements = self._disjoint_placements(start_points[:remaining], occupied_fields, prismatic_target,
+                                                   revolute_target)
+        placements = next(all_placements, None)
+        if placements is None:
+            failed_states.add(state)
+            return
+        if len(start_points) >= remaining:
+            # all remaining start points are known and new start points will not be used anymore
+            yield placements
+            yield from all_placements
+            return
+
+        # try either a prismatic or a revolute joint first (random) and the other type of joint afterwards
+        threshold = prismatic_target / (prismatic_target + revolute_target)
+        try_prismatic_first = self.random.random() < threshold
+        start_point = start_points[0]
+        found = False
+        for prismatic in (try_prismatic_first, not try_prismatic_first):
+            if prismatic and prismatic_target == 0 or not prismatic and revolute_target == 0:
+                continue
+            positions = self._positions(prismatic)
+            self.random.shuffle(positions)
+            for direction in positions:
+                if not self.available(direction, start_point, occupied_fields):
+                    continue
+                new_occupied_fields = self.occupy(direction, start_point, occupied_fields)
+                if prismatic:
+                    targets = prismatic_target - 1, revolute_target
+                else:
+                    targets = prismatic_target, revolute_target - 1
+                next_states = set()
+                for new_start_points, new_branching_target in self._new_start_points_options(direction, start_point,
+                                                                                             branching_target):
+                    # start points beyond the number of remaining joints will never be used
+                    next_start_points = (start_points[1:] + new_start_points)[:sum(targets)]
+                    if len(next_start_points) == sum(targets):
+                        new_branching_target = 0  # no more start points are needed, so further branches do not matter
+                    if (next_start_points, new_branching_target) in next_states:
+                        continue
+                    next_states.add((next_start_points, new_branching_target))
+                    for sequence in self._search(next_start_points, new_occupied_fields, new_branching_target,
+                                                 *targets, failed_states):
+                        found = True
+                        yield [(direction, start_point)] + sequence
+        if not found:
+            failed_states.add(state)
+
+    def _cells(self, direction, start_point, at_limit):
+        """Return the fields that a link occupies at its lower limit (at_limit=False) or at its upper limit."""
+        fields = self.fields_to_occupy[direction]
         if len(direction) == 1:  # prismatic
-            direction_field = self.fields_to_occupy[direction][-1]
-            new_start_point = calc.tuple_add(self.start_points[0], direction_field)
-            self.start_points.append(new_start_point)
+            cells = fields[:2] if at_limit else ((0, 0), fields[0])
         else:  # revolute
-            new_start_points_amount = 1 + self.branching_per_revolute_joint
-            direction_fields = self.fields_to_occupy[direction][-new_start_points_amount:]
-            new_start_points = [calc.tuple_add(self.start_points[0], df) for df in direction_fields]
-            shuffle(new_start_points)
-            self.start_points.append(new_start_points.pop())
-            for new_start_point in new_start_points:
-                if self.branching_target != 0:
-                    self.start_points.append(new_start_point)
-                    self.branching_target -= 1
-                else:
-                    break
+            cells = (fields[0], fields[2], fields[3]) if at_limit else ((0, 0), fields[0], fields[1])
+        return frozenset(calc.tuple_add(start_point, field) for field in cells)
 
-    def _place_link(self, direction, prismatic: bool):
+    def solve_discrete(self, sequence, max_states=2 ** 20):
+        """
+        Exact solver for the placed links (sequence of (direction, start_point)) without OMPL: every joint is either
+        at its lower or at its upper limit and can move if no other link occupies a field that it sweeps.
+        Breadth-first search over all joint configurations that are reachable from the start (all joints at their lower
+        limit), the goal is reached when the first joint is at its upper limit.
+        Return the minimum number of joint moves, the number of reachable configurations and the branching along a
+        shortest solution (the number of other joints that could be moved in the configurations on the way to the goal,
+        so it grows with the number of wrong moves a solver can make). The number of moves and the branching are None if
+        the puzzle is unsolvable or if there are more than max_states reachable configurations.
+        """
+        cells = [(self._cells(d, p, False), self._cells(d, p, True)) for d, p in sequence]
+        swept = [self._cells(d, p, False).union(self.occupy(d, p, frozenset())) for d, p in sequence]
+        # joint i can only move if all joints in must_be_moved[i] are at their upper limit and all joints in
+        # must_be_unmoved[i] are at their lower limit (bitmasks over the joints, bit i is joint i at its upper limit)
+        must_be_moved = [0] * len(sequence)
+        must_be_unmoved = [0] * len(sequence)
+        for i in range(len(sequence)):
+            for j in range(len(sequence)):
+                if i != j and cells[j][0] & swept[i]:
+                    must_be_moved[i] |= 1 << j
+                if i != j and cells[j][1] & swept[i]:
+                    must_be_unmoved[i] |= 1 << j
+
+        def movable(configuration):
+            return [i for i in range(len(sequence))
+                    if configuration & must_be_moved[i] == must_be_moved[i] and not configuration & must_be_unmoved[i]]
+
+        parents = {0: None}
+        goal = None
+        queue = deque([0])
+        while queue:
+            configuration = queue.popleft()
+            if configuration & 1:
+                if goal is None:
+                    goal = configuration  # breadth-first, so the first goal configuration is one of the nearest
+                continue
+            if len(parents) > max_states:
+                print("DISCRETE SOLVER GAVE UP AFTER", len(parents), "CONFIGURATIONS")
+                return None, len(parents), None
+            for i in movable(configuration):
+                next_configuration = configuration ^ (1 << i)
+                if next_configuration not in parents:
+                    parents[next_configuration] = configuration
+                    queue.append(next_configuration)
+        if goal is None:
+            return None, len(parents), None
+
+        minimum_moves = 0
+        branching = 0
+        configuration = parents[goal]
+        while configuration is not None:
+            minimum_moves += 1
+            branching += len(movable(configuration)) - 1
+            configuration = parents[configuration]
+        return minimum_moves, len(parents), branching
+
+    def _place_link(self, direction, start_point):
+        prismatic = len(direction) == 1
         if prismatic:
             scale = (2 - self.epsilon, 1 - self.epsilon, 1 - self.epsilon)
         else:
             scale = (3 - self.epsilon, 1 - self.epsilon, 1 - self.epsilon)
         loc, rot, limit = self.link_position[direction]
-        sp = self.start_points[0]
-        loc = (sp[0] + loc[0], sp[1] + loc[1], scale[2] / 2)
+        loc = (start_point[0] + loc[0], start_point[1] + loc[1], scale[2] / 2)
         rot = (0, 0, rot)
 
         loc = calc.tuple_scale(loc, self.scaling)
@@ -242,91 +458,44 @@ class GridWorldSampler(PuzzleSampler):
 
         self.goal_space_append_with_adjustment(self.get_limits_tuple(limit))
 
-    def _choose_link(self, prismatic: bool):
-        if prismatic:
-            if self.prismatic_joints_target == 0:
-                return 1
-
-            positions = ("N", "E", "S", "W")
-
-        else:
-            if self.revolute_joints_target == 0:
-                return 1
-
-            if self.allow_clockwise:
-                positions = ("N_counterclockwise", "N_clockwise",
-                             "E_counterclockwise", "E_clockwise",
-                             "S_counterclockwise", "S_clockwise",
-                             "W_counterclockwise", "W_clockwise")
-            else:
-                positions = ("N_counterclockwise",
-                             "E_counterclockwise",
-                             "S_counterclockwise",
-                             "W_counterclockwise")
-
-        available_positions = tuple(p for p in positions if self.available(p))
-        if not available_positions:
-            return 1
-
-        random_pos = choice(available_positions)
-        self.position_sequence.append(random_pos)
-        self.occupy(random_pos)
-        self._add_new_start_points(random_pos)
-        self._place_link(random_pos, prismatic)
-        self.start_points.pop(0)
-
-        return 0
-
-    def _new_joint(self, try_prismatic_first):
-        result = 1
-        # try creating either a prismatic or a revolute joint
-        result = self._choose_link(prismatic=try_prismatic_first)
-        if result != 0:
-            # if creating that type of joint failed, try creating the other type of joint
-            result = self._choose_link(prismatic=not try_prismatic_first)
-
-        return result
-
     def _clean_up(self):
         self.goal_space = []
         self.prismatic_joints_target = self.number_prismatic_joints
         self.revolute_joints_target = self.number_revolute_joints
-        self.branching_target = self.branching_factor
-        self.start_points = [(0.5, 0.5)]
-        self.occupied_fields = self.start_points.copy()
         self.position_sequence = []
         self.blender_operations_queue = []
+        self.metadata = {}
 
     def _create_grid_world_puzzle(self):
-        """Create movable objects to become links for the puzzle (in a grid world)."""
-        try_prismatic: bool
-
-        for i in range(self.total_number_joints):
-            # in each iteration: try to figure out whether prismatic or revolute joint is needed
-            if self.prismatic_joints_target == 0:
-                # create revolute joint
-                try_prismatic = False
-            elif self.revolute_joints_target == 0:
-                # create prismatic joint
-                try_prismatic = True
-            else:
-                # create either revolute or prismatic joint (random)
-                threshold = self.prismatic_joints_target / (self.prismatic_joints_target + self.revolute_joints_target)
-                if random() < threshold:
-                    # create prismatic joint
-                    try_prismatic = True
-                else:
-                    # create revolute joint
-                    try_prismatic = False
-
-            # now we know whether we want a prismatic or revolute joint
-            # try to create the desired joint
-            result = self._new_joint(try_prismatic)
-            if result != 0:
-                print("ATTEMPT TO CREATE A SEQUENCE FAILED: " + str(self.position_sequence))
-                self._clean_up()
-                return result
+        """
+        Create movable objects to become links for the puzzle (in a grid world).
+        The sequence of links is searched with backtracking before anything is created in Blender. If the discrete
+        solver rejects a sequence, the search backtracks to the next one (at most attempts sequences are tried).
+        """
+        self._clean_up()
+        start_point = (0.5, 0.5)
+        sequences = self._search((start_point,), frozenset((start_point,)), self.branching_factor,
+                                 self.number_prismatic_joints, self.number_revolute_joints, set())
+        for sequence in islice(sequences, self.attempts):
+            minimum_moves, configurations, branching = self.solve_discrete(sequence)
+            if minimum_moves is not None:
+                break
+            print("THE DISCRETE SOLVER FOUND NO SOLUTION FOR THE SEQUENCE", [d for d, _ in sequence])
+        else:
+            print("THERE IS NO SOLVABLE SEQUENCE FOR", self.number_prismatic_joints, "PRISMATIC AND",
+                  self.number_revolute_joints, "REVOLUTE JOINTS")
+            return 1
+        self.metadata["solution_branching"] = branching  # difficulty label
+        self.metadata["minimum_moves"] = minimum_moves
+        self.metadata["reachable_configurations"] = configurations
+        for direction, start_point in sequence:
+            self.position_sequence.append(direction)
+            self._place_link(direction, start_point)
         print("SUCCESSFULLY CREATED THE FOLLOWING SEQUENCE: " + str(self.position_sequence))
+        print("minimum number of joint moves:", minimum_moves, "- branching along the solution:", branching)
+
+        self.world.initialize(self.floor_size)
+        self.world.scaling = self.scaling
         for operation in self.blender_operations_queue:
             operation()
         self.goal_space_narrow(dimension=0)
@@ -339,15 +508,16 @@ class GridWorldSampler(PuzzleSampler):
         return 0
 
     def build(self):
-        """Build complete model in Blender and export to URDF."""
+        """
+        Build complete model in Blender and export to URDF.
+        The backtracking search either finds a solvable sequence or gives up after attempts rejected sequences (or
+        proves that there is none), so only one attempt is needed.
+        """
         self.start_state = [0] * self.total_number_joints
-        for _ in range(self.attempts):
-            self.world.initialize(self.floor_size)
-            self.world.scaling = self.scaling
-            result = self._create_grid_world_puzzle()
-            if result == 0:
-                self.world.export()
-                return 0
+        result = self._create_grid_world_puzzle()
+        if result == 0:
+            self.world.export()
+            return 0
         print("GridWorldSampler failed!")
         return result
 
@@ -368,6 +538,20 @@ class ContinuousSpaceSampler(PuzzleSampler):
         self.upper_limit_revolute = config["upper_limit_revolute"]
         self.attempts_per_link = config["attempts_per_link"]
         self.start_points = [(0, 0)]
+        self.swept_areas = []  # ("polygon", corners) or ("circle", center, radius) of every movable link
+        if "parallel_candidates" in config:
+            self.parallel_candidates = config["parallel_candidates"]
+        else:
+            self.parallel_candidates = 1
+        if "planner_portfolio" in config:
+            self.planner_portfolio = config["planner_portfolio"]
+        else:
+            self.planner_portfolio = None
+        self.solver_pool = None
+        self.candidate_directories = set()
+        self.saved_planner_calls = 0
+        self.pre_filter_margin = 0.01
+        self.attempt = 0  # selects the random substreams of the links
 
     def _get_random_limit(self, is_prismatic):
         """
@@ -376,10 +560,10 @@ class ContinuousSpaceSampler(PuzzleSampler):
         """
         if is_prismatic:
             diff = self.upper_limit_prismatic[1] - self.upper_limit_prismatic[0]
-            return round(random() * diff + self.upper_limit_prismatic[0], 5)
+            return round(self.random.random() * diff + self.upper_limit_prismatic[0], 5)
         else:
             diff = self.upper_limit_revolute[1] - self.upper_limit_revolute[0]
-            limit = random() * diff * 2 - diff
+            limit = self.random.random() * diff * 2 - diff
             if limit > 0:
                 limit += self.upper_limit_revolute[0]
             else:
@@ -402,18 +586,48 @@ class ContinuousSpaceSampler(PuzzleSampler):
             link_oriented = calc.rotate((self.revolute_length, 0), rotation + calc.RAD90)
             self.start_points.append(calc.tuple_add(pos, link_oriented))
 
+    def _add_swept_area(self, is_prismatic, pos, rotation, limit):
+        """Remember the 2D area that the link can cover within its joint limits (seen from above)."""
+        if is_prismatic:
+            center = calc.tuple_add(pos, calc.rotate((0, limit / 2), rotation))
+            corners = calc.rectangle_corners(center, (self.prismatic_length + abs(limit), 1), rotation + calc.RAD90)
+            self.swept_areas.append(("polygon", corners))
+        else:
+            # the link rotates around its center, so it always stays within the circle of its half diagonal
+            radius = ((self.revolute_length / 2) ** 2 + 0.5 ** 2) ** 0.5
+            self.swept_areas.append(("circle", pos, radius))
+
+    def _can_block(self, is_prismatic, pos, rotation):
+        """
+        Return False if an immovable link at this pose can not block any movable link, because it does not overlap
+        with any area that the movable links can cover. Such a link can not make the puzzle unsolvable.
+        All links have the same height and their handles and hinges stay within their footprint, so it is enough to
+        check the footprints in 2D. The check is conservative: it may return True for links that do not block.
+        """
+        margin = 2 * self.pre_filter_margin
+        if is_prismatic:
+            corners = calc.rectangle_corners(pos, (self.prismatic_length + margin, 1 + margin), rotation + calc.RAD90)
+        else:
+            corners = calc.rectangle_corners(pos, (self.revolute_length + margin, 1 + margin), rotation)
+        for area in self.swept_areas:
+            if area[0] == "polygon" and calc.polygons_intersect(corners, area[1]):
+                return True
+            if area[0] == "circle" and calc.polygon_intersects_circle(corners, area[1], area[2]):
+                return True
+        return False
+
     def _sample_first_joint(self):
         """
         Place the first link+joint at start_point
         """
         self.start_state.append(0)
         threshold = self.prismatic_joints_target / (self.prismatic_joints_target + self.revolute_joints_target)
-        rotation = round(random() * calc.RAD360, 5)
+        rotation = round(self.random.random() * calc.RAD360, 5)
         start_point = self.start_points[0]
         # since this is the first joint, we do not need to check solvability
         # but the goal is to move link0 to a specific location
         # so this dimension in the goal space must be narrowed
-        if random() < threshold:
+        if self.random.random() < threshold:
             # create prismatic joint
             limit = self._get_random_limit(True)
             self.world.new_link((start_point[0], start_point[1], 0.5), (0, 0, rotation + calc.RAD90),
@@ -422,6 +636,7 @@ class ContinuousSpaceSampler(PuzzleSampler):
             self.world.create_goal_duplicate((limit, 0, 0))
             self.prismatic_joints_target -= 1
             self._calculate_next_start_point(True, start_point, rotation, limit)
+            self._add_swept_area(True, start_point, rotation, limit)
         else:
             # create revolute joint
             limit = self._get_random_limit(False)
@@ -431,8 +646,46 @@ class ContinuousSpaceSampler(PuzzleSampler):
             self.world.create_goal_duplicate(rotation_offset=(0, 0, limit))
             self.revolute_joints_target -= 1
             self._calculate_next_start_point(False, start_point, rotation, limit)
+            self._add_swept_area(False, start_point, rotation, limit)
         self.goal_space_append_with_adjustment((limit, limit))
 
+    def _sample_candidate(self, threshold):
+        """Return a random (is_prismatic, position, rotation) for the next link+joint."""
+        offset = (self.random.random() * self.area_size - self.area_size / 2,
+                  self.random.random() * self.area_size - self.area_size / 2)
+        self.random.shuffle(self.start_points)
+        start_point = self.start_points[0]
+        new_point = calc.tuple_add(start_point, offset)
+        new_point = round(new_point[0], 5), round(new_point[1], 5)
+        rotation = round(self.random.random() * calc.RAD360, 5)
+        return self.random.random() < threshold, new_point, rotation
+
+    def _new_immovable_link(self, is_prismatic, new_point, rotation):
+        if is_prismatic:
+            # create immovable prismatic joint (joint limits = 0)
+            self.world.new_link((new_point[0], new_point[1], 0.5), (0, 0, rotation + calc.RAD90),
+                                (self.prismatic_length, 1, 1), 'prismatic', limits=(0, 0),
+                                create_handle=self.create_handle, joint_axis=(1, 0, 0))
+        else:
+            # create immovable revolute joint (joint limits = 0)
+            self.world.new_link((new_point[0], new_point[1], 0.5), (0, 0, rotation), (self.revolute_length, 1, 1),
+                                'revolute', limits=(0, 0), create_handle=self.create_handle, hinge_diameter=None)
+
+    def _accept_joint(self, is_prismatic, new_point, rotation, limit):
+        self._calculate_next_start_point(is_prismatic, new_point, rotation, limit)
+        self._add_swept_area(is_prismatic, new_point, rotation, limit)
+        if is_prismatic:
+            self.prismatic_joints_target -= 1
+        else:
+            self.revolute_joints_target -= 1
+
+    def _solve(self, planning_time):
+        """Test solvability of the current puzzle with the planner portfolio (if configured) or RRTConnect."""
+        if self.planner_portfolio:
+            return solve_portfolio(self.world.urdf_path, self.start_state, self.goal_space, planning_time,
+                                   self.planner_portfolio, family=type(self).__name__, verbose=False)
+        return solve(self.world.urdf_path, self.start_state, self.goal_space, planning_time, verbose=False)
+
     def _sample_next_joint(self):
         """
         Assume that the first link+joint as been placed already.
@@ -440,29 +693,18 @@ class ContinuousSpaceSampler(PuzzleSampler):
         1. is UNsolvable if the new link+joint can NOT be moved
         2. is SOLVABLE if the new link+joint CAN be moved
         """
+        if self.parallel_candidates > 1:
+            return self._sample_next_joint_in_parallel()
         threshold = self.prismatic_joints_target / (self.prismatic_joints_target + self.revolute_joints_target)
-        is_prismatic: bool
         for i in range(self.attempts_per_link):
-            offset = random() * self.area_size - self.area_size / 2, random() * self.area_size - self.area_size / 2
-            shuffle(self.start_points)
-            start_point = self.start_points[0]
-            new_point = calc.tuple_add(start_point, offset)
-            new_point = round(new_point[0], 5), round(new_point[1], 5)
-            rotation = round(random() * calc.RAD360, 5)
-            if random() < threshold:
-                # create immovable prismatic joint (joint limits = 0)
-                self.world.new_link((new_point[0], new_point[1], 0.5), (0, 0, rotation + calc.RAD90),
-                                    (self.prismatic_length, 1, 1), 'prismatic', limits=(0, 0),
-                                    create_handle=self.create_handle, joint_axis=(1, 0, 0))
-                is_prismatic = True
-            else:
-                # create immovable revolute joint (joint limits = 0)
-                self.world.new_link((new_point[0], new_point[1], 0.5), (0, 0, rotation), (self.revolute_length, 1, 1),
-                                    'revolute', limits=(0, 0), create_handle=self.create_handle, hinge_diameter=None)
-                is_prismatic = False
+            is_prismatic, new_point, rotation = self._sample_candidate(threshold)
+            if not self._can_block(is_prismatic, new_point, rotation):
+                # the puzzle would still be solvable with this link, no need to export and ask the planner
+                self.saved_planner_calls += 1
+                continue
+            self._new_immovable_link(is_prismatic, new_point, rotation)
             self.world.export(render_images=False)
-            result = solve(self.world.urdf_path, self.start_state, self.goal_space,
-                           self.planning_time * self.first_test_time_multiplier, verbose=False)
+            result = self._solve(self.planning_time * self.first_test_time_multiplier)
             if result == 0:
                 # can be solved with the immovable joint
                 # we do not want that
@@ -480,14 +722,9 @@ class ContinuousSpaceSampler(PuzzleSampler):
                 self.start_state.append(0)
 
                 # and check solvability again
-                result = solve(self.world.urdf_path, self.start_state, self.goal_space, self.planning_time,
-                               verbose=False)
+                result = self._solve(self.planning_time)
                 if result == 0:
-                    self._calculate_next_start_point(is_prismatic, new_point, rotation, limit)
-                    if is_prismatic:
-                        self.prismatic_joints_target -= 1
-                    else:
-                        self.revolute_joints_target -= 1
+                    self._accept_joint(is_prismatic, new_point, rotation, limit)
                     return 0
                 else:
                     self.start_state.pop()
@@ -496,10 +733,81 @@ class ContinuousSpaceSampler(PuzzleSampler):
 
         return 1
 
+    def _export_candidate(self, name):
+        """Export the current model under another name (and directory) and return the path of the URDF."""
+        original_name = self.world.name
+        self.world.update_name(name)
+        self.world.export(render_images=False)
+        self.candidate_directories.add(self.world.directory)
+        urdf_path = self.world.urdf_path
+        self.world.update_name(original_name)
+        return urdf_path
+
+    def _sample_next_joint_in_parallel(self):
+        """
+        Like _sample_next_joint() but parallel_candidates candidates are exported at once (each with an immovable and
+        a movable version) and the tests of all candidates run concurrently in the solver pool. The movable version of
+        a candidate is only tested after its immovable version blocked the puzzle.
+        The first accepted candidate (in the order of sampling) is added to the puzzle, the tests that are still
+        running are stopped, so they do not hold up the candidates of the next round.
+        """
+        threshold = self.prismatic_joints_target / (self.prismatic_joints_target + self.revolute_joints_target)
+        attempts = 0
+        while attempts < self.attempts_per_link:
+            candidates = []
+            while len(candidates) < self.parallel_candidates and attempts < self.attempts_per_link:
+                attempts += 1
+                is_prismatic, new_point, rotation = self._sample_candidate(threshold)
+                if not self._can_block(is_prismatic, new_point, rotation):
+                    self.saved_planner_calls += 1
+                    continue
+                candidates.append((is_prismatic, new_point, rotation, self._get_random_limit(is_prismatic)))
+
+            tests = []
+            for k, (is_prismatic, new_point, rotation, limit) in enumerate(candidates):
+                name = self.world.name + "_candidate" + str(k)
+                self._new_immovable_link(is_prismatic, new_point, rotation)
+                immovable_urdf_path = self._export_candidate(name + "_immovable")
+                self.world.set_limit_of_latest_link(limit, is_prismatic)
+                movable_urdf_path = self._export_candidate(name + "_movable")
+                self.world.remove_last_object()
+
+                self.goal_space_append_with_adjustment(self.get_limits_tuple(limit))
+                goal_space = self.goal_space.copy()
+                self.goal_space.pop()
+                immovable_test = self.solver_pool.submit(immovable_urdf_path, self.start_state, self.goal_space,
+                                                         self.planning_time * self.first_test_time_multiplier)
+                # the immovable link must block the puzzle, otherwise the movable link does not need to be tested
+                movable_test = self.solver_pool.submit_after(immovable_test, lambda returncode: returncode != 0,
+                                                             movable_urdf_path, self.start_state + [0], goal_space,
+                                                             self.planning_time)
+                tests.append((immovable_test, movable_test))
+
+            accepted = None
+            for k, (immovable_test, movable_test) in enumerate(tests):
+                # the movable link must not block the puzzle (its test only runs if the immovable link blocks it)
+                if movable_test.result() == 0:
+                    accepted = k
+                    break
+            self.solver_pool.stop([test for candidate_tests in tests for test in candidate_tests])
+
+            if accepted is not None:
+                is_prismatic, new_point, rotation, limit = candidates[accepted]
+                self._new_immovable_link(is_prismatic, new_point, rotation)
+                self.world.set_limit_of_latest_link(limit, is_prismatic)
+                self.world.export(render_images=False)
+                self.goal_space_append_with_adjustment(self.get_limits_tuple(limit))
+                self.start_state.append(0)
+                self._accept_joint(is_prismatic, new_point, rotation, limit)
+                return 0
+
+        return 1
+
     def _clean_up(self):
         self.prismatic_joints_target = self.number_prismatic_joints
         self.revolute_joints_target = self.number_revolute_joints
         self.start_points = [(0, 0)]
+        self.swept_areas = []
         self.start_state = []
         self.goal_space = []
         self.planning_time = self.initial_planning_time
@@ -508,8 +816,12 @@ class ContinuousSpaceSampler(PuzzleSampler):
         """
         Sample links with joints iteratively
         """
+        self.random = self.substream("attempt", self.attempt, "link", 0)
         self._sample_first_joint()
         for i in range(1, self.total_number_joints):
+            # every link draws from its own substream, so the candidates of link i do not depend on how many
+            # candidates the links before it needed
+            self.random = self.substream("attempt", self.attempt, "link", i)
             result = self._sample_next_joint()
             if result != 0:
                 print("\U000026D4 " * 64)
@@ -525,17 +837,33 @@ class ContinuousSpaceSampler(PuzzleSampler):
         return 0
 
     def build(self):
-        """Build complete model in Blender and export to URDF. Sample random positions for joints."""
-        for i in range(self.attempts):
-            self.world.initialize(self.floor_size)
-            result = self._create_continuous_space_puzzle()
-            progress = round((i + 1) / self.attempts * 100)
-            print("Attempt", i + 1, "of", self.attempts, "done [" + ("#" * progress) + (" " * (100 - progress)) + "]")
-            if result == 0:
-                self.world.render_images()
-                return 0
-        print("ContinuousSpaceSampler failed!")
-        return result
+        """
+        Build complete model in Blender and export to URDF. Sample random positions for joints.
+        If parallel_candidates > 1, candidates are tested concurrently by a pool of 2 * parallel_candidates solvers.
+        """
+        if self.parallel_candidates > 1:
+            self.solver_pool = SolverPool(2 * self.parallel_candidates)
+        try:
+            for i in range(self.attempts):
+                self.attempt = i
+                self.world.initialize(self.floor_size)
+                result = self._create_continuous_space_puzzle()
+                progress = round((i + 1) / self.attempts * 100)
+                print("Attempt", i + 1, "of", self.attempts, "done [" + ("#" * progress) + (" " * (100 - progress)) +
+                      "]")
+                print("Geometric pre-filter saved", self.saved_planner_calls, "planner calls so far")
+                if result == 0:
+                    self.world.render_images()
+                    return 0
+            print("ContinuousSpaceSampler failed!")
+            return result
+        finally:
+            if self.solver_pool:
+                self.solver_pool.close()
+                self.solver_pool = None
+            for directory in self.candidate_directories:
+                shutil.rmtree(directory, ignore_errors=True)
+            self.candidate_directories = set()
 
 
 class Lockbox2017Sampler(PuzzleSampler):
@@ -606,9 +934,9 @@ class LockboxRandomSampler(PuzzleSampler):
 
     def add_slot_disc_and_slider(self, direction):
         if len(self.radius) == 2:
-            radius = self.radius[0] + random() * (self.radius[1] - self.radius[0])
+            radius = self.radius[0] + self.random.random() * (self.radius[1] - self.radius[0])
         else:
-            radius = choice(self.radius)
+            radius = self.random.choice(self.radius)
         rotation = self.get_rotation[direction]
 
         offset_start = calc.tuple_scale(calc.DIRECTION_VECTOR_2D[self.previous_direction], radius + 1)
@@ -627,7 +955,7 @@ class LockboxRandomSampler(PuzzleSampler):
 
     def choose_links(self):
         directions = self.available_directions[self.previous_direction]
-        shuffle(directions)
+        self.random.shuffle(directions)
         for random_direction in directions:
             new_start = self.add_slot_disc_and_slider(random_direction)
             self.start_state.append(0)
@@ -652,7 +980,7 @@ class LockboxRandomSampler(PuzzleSampler):
         self.world.initialize(self.floor_size)
 
         # first slider
-        self.previous_direction = choice(("N", "E", "S", "W"))
+        self.previous_direction = self.random.choice(("N", "E", "S", "W"))
         rotation = self.get_rotation[self.previous_direction]
         self.world.new_link((self.start_point[0], self.start_point[1], 0.5), (0, 0, rotation),
                             (self.slider_length, self.slider_width, 1), 'prismatic', (0, 1),
@@ -693,7 +1021,7 @@ class EscapeRoomSampler(PuzzleSampler):
         self.world.create_goal_duplicate((0, 5, 0), (0, 0, calc.RAD90))
 
         # add obstacle
-        y = random() * 2 + 1
+        y = self.random.random() * 2 + 1
         self.world.new_link_2d_plus_rotation((-0.75, y, 0.25), (0, 0, 0), (1.5, 0.5, 0.5), (-6, 6), (-6, 6),
                                              mesh=self.stick_mesh, material=color.BROWN)
         self.start_state.extend((0, 0, 0))
@@ -733,7 +1061,8 @@ class MoveTwiceSampler(PuzzleSampler):
         # start = (random() * 3 - 1.5, random() * 1.4 - 0.7, random() * calc.RAD360 - calc.RAD180)
         self.start_state.extend(start)
 
-        goal = (random() * 3 - 1.5, random() * 1.4 - 0.7 + 3, random() * calc.RAD360 - calc.RAD180)
+        goal = (self.random.random() * 3 - 1.5, self.random.random() * 1.4 - 0.7 + 3,
+                self.random.random() * calc.RAD360 - calc.RAD180)
         self.goal_space_append_with_adjustment((goal[0], goal[0]))
         self.goal_space_append_with_adjustment((goal[1], goal[1]))
         self.goal_space_append_with_adjustment((goal[2], goal[2]))
@@ -773,7 +1102,7 @@ class MoveNTimesSampler(PuzzleSampler):
                                              mesh=self.robot_mesh)
         start = (0, 0, 0)
         self.start_state.extend(start)
-        goal = (random() * n * 2 - n, -n, random() * calc.RAD360 - calc.RAD180)
+        goal = (self.random.random() * n * 2 - n, -n, self.random.random() * calc.RAD360 - calc.RAD180)
         self.goal_space_append_with_adjustment((goal[0], goal[0]))
         self.goal_space_append_with_adjustment((goal[1], goal[1]))
         self.goal_space_append_with_adjustment((goal[2], goal[2]))
@@ -885,7 +1214,7 @@ class RoomsSampler(PuzzleSampler):
             self.y_limits = (y_min, y)
 
     def _sample_position(self):
-        shuffle(self.direction_vectors)
+        self.random.shuffle(self.direction_vectors)
         for direction in self.direction_vectors:
             new_point = calc.tuple_add(self.start_point, direction)
             if new_point not in self.occupied_fields:
@@ -900,6 +1229,7 @@ class RoomsSampler(PuzzleSampler):
         previous_room_direction_inverted = (0, 0)
         pillar_scale = (self.wall_thickness, self.wall_thickness, self.wall_height)
         for i in range(self.number_rooms):
+            self.random = self.substream("room", i)  # doors and obstacles of room i
             current = self.occupied_fields[i]
             next = self.occupied_fields[i + 1]  # this list has self.number_rooms + 1 elements (incl. goal field)
             current_inverted = calc.tuple_scale(current, -1)
@@ -933,7 +1263,7 @@ class RoomsSampler(PuzzleSampler):
 
                     # add door
                     probability = self.doors_target / (self.number_rooms - i)
-                    if random() < probability:
+                    if self.random.random() < probability:
                         self.doors_target -= 1
                         off, rotation = self.offset_rotation[direction]
                         off = calc.tuple_scale(off, 0.4 * self.door_width)
@@ -945,7 +1275,7 @@ class RoomsSampler(PuzzleSampler):
 
                         # add door obstacle (d_obstacle)
                         d_obstacle_probability = self.door_obstacles_target / (self.doors_target + 1)
-                        if random() < d_obstacle_probability:
+                        if self.random.random() < d_obstacle_probability:
                             self.door_obstacles_target -= 1
                             d_obstacle_loc = 0.5 - self.wall_thickness - self.door_obstacle_gap - self.door_obstacle_scale[1] / 2
                             d_obstacle_loc = calc.tuple_add(current, calc.tuple_scale(direction, d_obstacle_loc))
@@ -985,6 +1315,7 @@ class RoomsSampler(PuzzleSampler):
         # add first room position
         self.occupied_fields.append(self.start_point)
 
+        self.random = self.substream("rooms")
         for _ in range(self.number_rooms):
             result = self._sample_position()
             if result != 0:
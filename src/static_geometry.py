@@ -0,0 +1,191 @@
+"""
+Merge the static geometry of a puzzle (walls, pillars, ...) into fewer links. Every leaf link with one collision box
+that is attached to the root link by a fixed joint is static. Static boxes with the same orientation and the same
+cross-section that touch or overlap along one axis (collinear wall segments and the pillars between them) fuse into one
+box, and the links of each fused box are replaced by one link with this box as its only collision object (and all
+visual objects of the replaced links). This leaves fewer links and far fewer link pairs to check for collisions.
+A link never gets more than one collision object: pybullet misses contacts with links that have several of them.
+"""
+import xml.etree.ElementTree as ET
+
+from urdf_document import vector_to_str, joint_xml
+import calc
+
+LINK_NAME = "static_geometry"
+DECIMAL_PLACES = 7  # boxes only fuse if their cross-sections are equal up to this precision
+
+
+def _vector(text, default=(0., 0., 0.)):
+    return tuple(float(x) for x in text.split()) if text else default
+
+
+def _origin(element):
+    """Return (rotation matrix, translation) of the <origin> child of the element."""
+    origin = element.find('origin')
+    if origin is None:
+        return calc.euler_to_matrix((0, 0, 0)), (0., 0., 0.)
+    return calc.euler_to_matrix(_vector(origin.get('rpy'))), _vector(origin.get('xyz'))
+
+
+def _global(rotation, point):
+    return tuple(sum(row[i] * point[i] for i in range(3)) for row in rotation)
+
+
+def _compose(transform_a, transform_b):
+    rotation_a, translation_a = transform_a
+    rotation_b, translation_b = transform_b
+    rotation = tuple(tuple(sum(row[k] * rotation_b[k][j] for k in range(3)) for j in range(3)) for row in rotation_a)
+    return rotation, tuple(x + t for x, t in zip(_global(rotation_a, translation_b), translation_a))
+
+
+def _local(rotation, point):
+    """Rotate point by the inverse (transpose) of rotation."""
+    return tuple(sum(rotation[i][j] * point[i] for i in range(3)) for j in range(3))
+
+
+def _relative(transform_a, transform_b):
+    """Return transform_b in the frame of transform_a."""
+    rotation_a, translation_a = transform_a
+    rotation_b, translation_b = transform_b
+    rotation = tuple(tuple(sum(rotation_a[k][i] * rotation_b[k][j] for k in range(3)) for j in range(3))
+                     for i in range(3))
+    return rotation, _local(rotation_a, tuple(b - a for a, b in zip(translation_a, translation_b)))
+
+
+def _fuse_boxes(boxes, gap):
+    """
+    boxes: [(low, high, sources)] with the corners of each box in a common frame.
+    Join boxes that have the same extent along two axes and touch or overlap (up to gap) along the third one, so the
+    joined box is their union (plus the gaps). Repeated until nothing changes, so rows of segments become one box.
+    Returns the joined boxes, their sources are the sources of all boxes they contain.
+    """
+    boxes = [(list(low), list(high), list(sources)) for low, high, sources in boxes]
+    fused = True
+    while fused:
+        fused = False
+        for axis in range(3):
+            others = [i for i in range(3) if i != axis]
+            rows = {}
+            for box in boxes:
+                key = tuple(round(box[side][i], DECIMAL_PLACES) for i in others for side in (0, 1))
+                rows.setdefault(key, []).append(box)
+            boxes = []
+            for row in rows.values():
+                row.sort(key=lambda box: box[0][axis])
+                current = row[0]
+                for box in row[1:]:
+                    if box[0][axis] <= current[1][axis] + gap:
+                        current[1][axis] = max(current[1][axis], box[1][axis])
+                        current[2].extend(box[2])
+                        fused = True
+                    else:
+                        boxes.append(current)
+                        current = box
+                boxes.append(current)
+    return boxes
+
+
+def _element_xml(tag, name, rotation, translation, geometry_xml, material):
+    xml = '      <' + tag + ' name="' + name + '">\n'
+    xml += '        <origin xyz="' + vector_to_str(translation) + '" rpy="' + \
+           vector_to_str(calc.matrix_to_euler(rotation)) + '"/>\n'
+    xml += '        <geometry>\n'
+    xml += '          ' + geometry_xml + '\n'
+    xml += '        </geometry>\n'
+    if material:
+        xml += '        <material name="' + material + '"/>\n'
+    xml += '      </' + tag + '>\n'
+    return xml
+
+
+def _static_links(urdf_document):
+    """Return the root link and {link name: joint name} of all static links (see above)."""
+    joints = {}  # joint name -> (child, parent, joint element)
+    for name in urdf_document.names('joint'):
+        joint = ET.fromstring(urdf_document.get_element('joint', name))
+        joints[name] = (joint.find('child').get('link'), joint.find('parent').get('link'), joint)
+    parents = {parent for _, parent, _ in joints.values()}
+    children = {child for child, _, _ in joints.values()}
+    roots = [name for name in urdf_document.names('link') if name not in children]
+    if len(roots) != 1:
+        return None, {}
+    static = {}
+    for name, (child, parent, joint) in joints.items():
+        if parent == roots[0] and joint.get('type') == 'fixed' and child not in parents:
+            collisions = ET.fromstring(urdf_document.get_element('link', child)).findall('collision')
+            if len(collisions) == 1 and collisions[0].find('geometry')[0].tag == 'box':
+                static[child] = joint
+    return roots[0], static
+
+
+def merge_static_geometry(urdf_document, srdf_document=None, gap=1e-4):
+    """
+    Replace the static links of the URDF (UrdfDocument, see urdf_document.py) whose boxes fuse by one link per fused
+    box. gap is the largest distance between boxes that are joined (e.g. the link_shrink between a wall and a pillar).
+    The elements of the removed links and joints are also removed from the SRDF. Returns the names of the merged links.
+    """
+    root, static = _static_links(urdf_document)
+    groups = {}  # rotation -> (rotation, [(low, high, [link name]) of each box in the rotated frame])
+    links = {}  # link name -> (rotation, translation) of the link in the frame of the root
+    for link_name, joint in static.items():
+        links[link_name] = _origin(joint)
+        collision = ET.fromstring(urdf_document.get_element('link', link_name)).find('collision')
+        rotation, translation = _compose(links[link_name], _origin(collision))
+        center = _local(rotation, translation)
+        half = tuple(x / 2 for x in _vector(collision.find('geometry')[0].get('size')))
+        box = (tuple(c - h for c, h in zip(center, half)), tuple(c + h for c, h in zip(center, half)), [link_name])
+        groups.setdefault(tuple(round(x, 4) for row in rotation for x in row), (rotation, []))[1].append(box)
+
+    merged = []
+    for rotation, boxes in groups.values():
+        for low, high, sources in _fuse_boxes(boxes, gap):
+            if len(sources) > 1:
+                merged.append((rotation, low, high, sorted(sources)))
+    merged.sort(key=lambda fused: fused[3])
+
+    for i, (rotation, low, high, sources) in enumerate(merged):
+        name = LINK_NAME + "_" + str(i)
+        # the frame of the link is the center of its box like Phobos exports it: pybullet misses contacts with
+        # collision objects that are not at the origin of their link
+        frame = (rotation, _global(rotation, tuple((a + b) / 2 for a, b in zip(low, high))))
+        visuals = []
+        for link_name in sources:
+            for visual in ET.fromstring(urdf_document.get_element('link', link_name)).findall('visual'):
+                material = visual.find('material')
+                geometry = ET.tostring(visual.find('geometry')[0], encoding='unicode').strip().replace(' />', '/>')
+                visuals.append(_relative(frame, _compose(links[link_name], _origin(visual))) +
+                               (geometry, material.get('name') if material is not None else None))
+            urdf_document.remove_element('link', link_name)
+            urdf_document.remove_element('joint', static[link_name].get('name'))
+        xml = '    <link name="' + name + '">\n'
+        xml += '      <inertial>\n'
+        xml += '        <origin xyz="0 0 0" rpy="0 0 0"/>\n'
+        xml += '        <mass value="0.001"/>\n'
+        xml += '        <inertia ixx="0.001" ixy="0" ixz="0" iyy="0.001" iyz="0" izz="0.001"/>\n'
+        xml += '      </inertial>\n'
+        xml += "".join(_element_xml('visual', name + "_visual_" + str(j), *visual) for j, visual in enumerate(visuals))
+        xml += _element_xml('collision', name + "_collision", calc.euler_to_matrix((0, 0, 0)), (0., 0., 0.),
+                            '<box size="' + vector_to_str(b - a for a, b in zip(low, high)) + '"/>', None)
+        xml += '    </link>\n\n'
+        urdf_document.set_element('link', name, xml)
+        urdf_document.set_element('joint', name, joint_xml(name, 'fixed', vector_to_str(frame[1]),
+                                                           vector_to_str(calc.matrix_to_euler(rotation)), root))
+
+        if srdf_document is not None:
+            had_passive_joint = False
+            for link_name in sources:
+                joint_name = static[link_name].get('name')
+                had_passive_joint |= joint_name in srdf_document.names('passive_joint')
+                srdf_document.remove_element('passive_joint', joint_name)
+                srdf_document.remove_element('link_sphere_approximation', link_name)
+            for pair in srdf_document.names('disable_collisions'):
+                if any(link_name in sources for link_name in pair.split(" ")):
+                    srdf_document.remove_element('disable_collisions', pair)
+            if had_passive_joint:
+                srdf_document.set_element('passive_joint', name, '    <passive_joint name="' + name + '"/>\n\n')
+            if 'link_sphere_approximation' in srdf_document.elements:
+                srdf_document.set_element('link_sphere_approximation', name,
+                                          '    <link_sphere_approximation link="' + name + '">\n'
+                                          '      <sphere center="0.0 0.0 0.0" radius="0"/>\n'
+                                          '    </link_sphere_approximation>\n\n')
+    return sorted(link_name for _, _, _, sources in merged for link_name in sources)
@@ -0,0 +1,132 @@
+import os
+import re
+import struct
+
+PHOBOS_COMMENT = '<!-- created with Phobos 1.0.1 "Capricious Choutengan" -->'
+DECIMAL_PLACES = 5
+URDF_TAGS = ('link', 'joint', 'material')
+SRDF_TAGS = ('passive_joint', 'link_sphere_approximation', 'disable_collisions')
+
+
+def to_str(value):
+    """Format a number like Phobos does: round it and write values close to zero as 0."""
+    if abs(value) < 10 ** -DECIMAL_PLACES:
+        return "0"
+    return str(round(float(value), DECIMAL_PLACES))
+
+
+def vector_to_str(vector):
+    return " ".join(map(to_str, vector))
+
+
+def single(vector):
+    """Round all values to single precision like Blender stores them, so the exported numbers are the same."""
+    return struct.unpack(str(len(vector)) + "f", struct.pack(str(len(vector)) + "f", *vector))
+
+
+def joint_xml(name, joint_type, xyz, rpy, parent, axis=(0, 0, 1), limits=(0, 0)):
+    """
+    Return the URDF element of a joint (as Phobos writes it). xyz and rpy are already formatted strings.
+    A movable joint whose lower and upper limit are equal is exported as fixed joint (like Phobos does it).
+    """
+    movable = joint_type != 'fixed' and limits[0] != limits[1]
+    xml = '    <joint name="' + name + '" type="' + (joint_type if movable else 'fixed') + '">\n'
+    xml += '      <origin xyz="' + xyz + '" rpy="' + rpy + '"/>\n'
+    xml += '      <parent link="' + parent + '"/>\n'
+    xml += '      <child link="' + name + '"/>\n'
+    if movable:
+        length = sum(x ** 2 for x in axis) ** 0.5
+        xml += '      <axis xyz="' + vector_to_str(x / length for x in axis) + '"/>\n'
+        xml += '      <limit lower="' + to_str(limits[0]) + '" upper="' + to_str(limits[1]) + \
+               '" effort="0" velocity="0"/>\n'
+    elif joint_type != 'fixed':
+        xml += '      <limit effort="0" velocity="0"/>\n'
+    xml += '    </joint>\n\n'
+    return xml
+
+
+class UrdfDocument:
+    """
+    In-memory URDF or SRDF file in the layout of Phobos: a header, elements (links, joints, materials, passive joints,
+    ...) grouped by tag and sorted by name and a footer.
+    Elements can be changed individually and write() only writes the bytes from the first change on.
+    """
+    def __init__(self, header, footer="", tags=()):
+        self.header = header
+        self.footer = footer
+        self.elements = {tag: {} for tag in tags}  # tag -> {name -> xml}, tags in the order of the file
+        self.filepath = None
+        self.written = b""
+
+    @classmethod
+    def read(cls, filepath, tags=()):
+        """Parse a URDF or SRDF file that has been exported by Phobos."""
+        with open(filepath, 'r') as f:
+            content = f.read()
+        blocks = content.split("\n\n")
+        document = cls(blocks[0] + "\n\n", tags=tags)
+        for block in blocks[1:]:
+            match = re.match(r' {4}<(\w+) (?:name|link|link1)="([^"]*)"(?: link2="([^"]*)")?', block)
+            if match:
+                name = match.group(2) if match.group(3) is None else match.group(2) + " " + match.group(3)
+                document.set_element(match.group(1), name, block + "\n\n")
+            elif block.strip():
+                document.footer = block
+        document.filepath = filepath
+        document.written = content.encode()
+        return document
+
+    def get_element(self, tag, name):
+        return self.elements[tag][name]
+
+    def set_element(self, tag, name, xml):
+        if tag not in self.elements:
+            self.elements[tag] = {}
+        self.elements[tag][name] = xml
+
+    def remove_element(self, tag, name):
+        if tag in self.elements:
+            self.elements[tag].pop(name, None)
+
+    def update_joint(self, name, joint_type, axis, limits):
+        """Replace type, axis and limits of a joint and keep its origin and parent."""
+        xml = self.get_element('joint', name)
+        origin = re.search(r'<origin xyz="([^"]*)" rpy="([^"]*)"/>', xml)
+        parent = re.search(r'<parent link="([^"]*)"/>', xml).group(1)
+        self.set_element('joint', name, joint_xml(name, joint_type, origin.group(1), origin.group(2), parent, axis,
+                                                  limits))
+
+    def names(self, tag):
+        return list(self.elements.get(tag, {}))
+
+    def remove_unused_materials(self):
+        """Phobos only exports materials that are used by at least one link."""
+        used = set()
+        for xml in self.elements.get('link', {}).values():
+            used.update(re.findall(r'<material name="([^"]*)"/>', xml))
+        for name in self.names('material'):
+            if name not in used:
+                self.remove_element('material', name)
+
+    def to_string(self):
+        content = self.header
+        for elements in self.elements.values():
+            content += "".join(elements[name] for name in sorted(elements))
+        return content + self.footer
+
+    def write(self, filepath):
+        """Write the document. If the file has been written by this document before, only write what changed."""
+        content = self.to_string().encode()
+        start = 0
+        if filepath == self.filepath and os.path.exists(filepath):
+            start = len(os.path.commonprefix((content, self.written)))
+            if start == len(content) == len(self.written):
+                return
+        else:
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'r+b' if start else 'wb') as f:
+            f.seek(start)
+            f.write(content[start:])
+            f.truncate()
+        self.filepath = filepath
+        self.written = content
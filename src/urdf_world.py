@@ -0,0 +1,327 @@
+import os
+import re
+import sys
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(DIR)
+from world import BlenderWorld
+from urdf_document import UrdfDocument, URDF_TAGS, SRDF_TAGS, PHOBOS_COMMENT, to_str, vector_to_str, single, \
+    joint_xml
+import color
+import calc
+
+
+class UrdfObject:
+    """Visual or collision object of a UrdfLink. Location and rotation are relative to the link."""
+    def __init__(self, name, geometry_type, size, material=None, location=(0, 0, 0), rotation=(0, 0, 0),
+                 parent=None):
+        self.name = name
+        self.geometry_type = geometry_type
+        self.size = single(size)
+        self.material = material
+        self.location = single(location)
+        self.rotation = single(rotation)
+        self.parent = parent
+
+    def copy(self, name, parent):
+        return UrdfObject(name, self.geometry_type, self.size, self.material, self.location, self.rotation, parent)
+
+
+class UrdfLink:
+    """Link together with the joint to its parent link. Location and rotation are relative to the parent link."""
+    def __init__(self, name, parent=None, location=(0, 0, 0), rotation=(0, 0, 0), joint_type=None, limits=(0, 0)):
+        self.name = name
+        self.parent = parent
+        self.location = single(location)
+        self.rotation = single(rotation)
+        self.joint_type = joint_type
+        self.limits = single(limits)
+        self.axis = (0, 0, 1)
+        self.visuals = []
+        self.collisions = []
+        self.children = []
+
+    def subtree(self):
+        links = [self]
+        for child in self.children:
+            links.extend(child.subtree())
+        return links
+
+
+class UrdfWorld(BlenderWorld):
+    """
+    BlenderWorld that neither needs Blender nor Phobos. The kinematic tree is built in plain Python and written to
+    URDF and SRDF in the same format as Phobos does it.
+    Only boxes and cylinders are supported (no meshes) and no images can be rendered.
+    New links, removed links and changed limits are applied to the URDF and SRDF of the last export, so an export only
+    renders the changed elements and only writes the bytes from the first change on.
+    """
+    def __init__(self, config):
+        super().__init__(config)
+        self.direct_data_construction = False  # UrdfObjects are always created without operators
+
+    def setup_scene(self):
+        pass
+
+    def reset(self):
+        self.init_attributes()
+
+    def initialize(self, floor_size=32, floor_thickness=0.2):
+        """Reset world, create base link and floor (no template needed, new UrdfObjects are cheap)."""
+        self.reset()
+        self.create_base_link()
+        self.create_floor(floor_size, floor_thickness)
+
+    def create_visual(self, location=(0, 0, 0), rotation=(0, 0, 0), scale=(1, 1, 1), material=None, name="",
+                      parent=None, mesh={}, is_cylinder=False):
+        """Create a visual object. Returns the object."""
+        if mesh:
+            raise ValueError("UrdfWorld can only create boxes and cylinders, use BlenderWorld for meshes")
+        scale = tuple(map(self.subtract_link_shrink, scale))
+        if name:
+            name = "_" + name
+        if is_cylinder:
+            return UrdfObject("visual_cylinder" + name, 'cylinder', scale, material, location, rotation, parent)
+        else:
+            return UrdfObject("visual_box" + name, 'box', scale, material, location, rotation, parent)
+
+    def create_link_and_joint(self, obj, name="", joint_type=None, limits=(0, 0)):
+        """Create link (at origin of object). Also create joint at child if joint_type is specified."""
+        if name != "base_link":
+            name = "link_" + name
+        link = UrdfLink(name, obj.parent, obj.location, obj.rotation, joint_type, limits)
+        if obj.parent:
+            obj.parent.children.append(link)
+        obj.location = (0, 0, 0)
+        obj.rotation = (0, 0, 0)
+        obj.parent = link
+        link.visuals.append(obj)
+
+    def update_joint_axis(self, link, direction_vector=(1, 0, 0)):
+        self.outdate_documents()
+        link.axis = direction_vector
+
+    def is_fixed(self, link):
+        return link.joint_type == 'fixed'
+
+    def _taken_names(self):
+        names = set()
+        for link in self.base_link.subtree():
+            names.add(link.name)
+            names.update(obj.name for obj in link.visuals + link.collisions)
+        return names
+
+    def _unique_name(self, name, taken_names):
+        """Return name or, if it is taken, name with the lowest free numeric suffix (like Blender does)."""
+        if name in taken_names:
+            base_name = re.sub(r"\.\d{3}$", "", name)
+            number = 1
+            while base_name + "." + f"{number:03}" in taken_names:
+                number += 1
+            name = base_name + "." + f"{number:03}"
+        taken_names.add(name)
+        return name
+
+    def _copy_subtree(self, link, parent, taken_names):
+        duplicate = UrdfLink(self._unique_name(link.name, taken_names), parent, link.location, link.rotation,
+                             link.joint_type, link.limits)
+        duplicate.axis = link.axis
+        duplicate.visuals = [obj.copy(self._unique_name(obj.name, taken_names), duplicate) for obj in link.visuals]
+        duplicate.collisions = [obj.copy(self._unique_name(obj.name, taken_names), duplicate)
+                                for obj in link.collisions]
+        duplicate.children = [self._copy_subtree(child, duplicate, taken_names) for child in link.children]
+        return duplicate
+
+    def duplicate_with_children(self, object):
+        self.outdate_documents()
+        duplicate = self._copy_subtree(object, object.parent, self._taken_names())
+        object.parent.children.append(duplicate)
+        return duplicate
+
+    def _resize_subtree(self, link, factor, is_root=True):
+        """Scale the subtree around the origin of its root link (like bpy.ops.transform.resize does)."""
+        factor = single((factor,))[0]
+        if not is_root:
+            link.location = single(tuple(x * factor for x in link.location))
+        for obj in link.visuals + link.collisions:
+            obj.location = single(tuple(x * factor for x in obj.location))
+            obj.size = single(tuple(x * factor for x in obj.size))
+        for child in link.children:
+            self._resize_subtree(child, factor, is_root=False)
+
+    def new_link(self, *args, **kwargs):
+        documents_outdated = self.documents_outdated
+        link = super().new_link(*args, **kwargs)
+        if not documents_outdated:
+            # only the new subtree and its ancestors (they might have been renamed) changed
+            ancestors = []
+            parent = link.parent
+            while parent:
+                ancestors.append(parent)
+                parent = parent.parent
+            self.documents_outdated = False
+            self._update_documents(self.urdf_document, self.srdf_document, ancestors + link.subtree())
+            names = set(obj.name for obj in self.base_link.subtree())
+            self.remove_from_documents([name for name in self.urdf_document.names('link') if name not in names])
+        return link
+
+    def remove_last_object(self):
+        link = self.movable_links.pop()
+        self.movable_joints.pop()
+        link.parent.children.remove(link)
+        self.remove_from_documents([obj.name for obj in link.subtree()])
+
+    def set_limit_of_latest_link(self, limit, is_prismatic):
+        """
+        If limit is negative (for revolute joints), lower limit will be set.
+        Otherwise, upper limit will be set.
+        """
+        link = self.movable_links[-1]
+        if not is_prismatic and limit < 0:
+            link.limits = single((limit, link.limits[1]))
+        else:
+            link.limits = single((link.limits[0], limit))
+        if not self.documents_outdated:
+            self.urdf_document.set_element('joint', link.name, self._joint_xml(link))
+
+    def zeroize_limits(self, link):
+        self.outdate_documents()
+        link.limits = (0., 0.)
+
+    def create_collision(self, visual_obj=None):
+        """Create collision objects from visual objects."""
+        self.outdate_documents()
+        if visual_obj:
+            collision = visual_obj.copy(visual_obj.name.replace("visual", "collision", 1), visual_obj.parent)
+            visual_obj.parent.collisions.append(collision)
+            return collision
+        else:
+            for link in self.base_link.subtree():
+                for visual in link.visuals:
+                    self.create_collision(visual)
+
+    def apply_to_subtree(self, object, new_material=None, remove_visual=False, remove_collision=False,
+                         zeroize_limits=False):
+        self.outdate_documents()
+        for link in object.subtree():
+            if remove_visual:
+                link.visuals = []
+            elif new_material:
+                for visual in link.visuals:
+                    visual.material = new_material
+            if remove_collision:
+                link.collisions = []
+            if zeroize_limits:
+                self.zeroize_limits(link)
+
+    def create_goal_duplicate(self, local_translate=(0, 0, 0), rotation_offset=(0, 0, 0),
+                              new_material=color.GREEN_TRANSLUCENT, shrink=True):
+        goal_duplicate = self.duplicate_with_children(self.movable_links[0])
+        if shrink:
+            self._resize_subtree(goal_duplicate, self.subtract_link_shrink(1))
+        self.apply_to_subtree(goal_duplicate, new_material, remove_collision=True, zeroize_limits=True)
+        local_translate = calc.tuple_scale(local_translate, self.scaling)
+        goal_duplicate.location = single(calc.tuple_add(goal_duplicate.location,
+                                                        calc.rotate_3d(local_translate, goal_duplicate.rotation)))
+        goal_duplicate.rotation = single(calc.tuple_add(goal_duplicate.rotation, rotation_offset))
+        goal_duplicate.name = "goal"
+        return goal_duplicate
+
+    def render_images(self, focal_length=90):
+        if self.render_positions:
+            print("UrdfWorld can not render images, use BlenderWorld instead")
+
+    def _object_xml(self, obj, tag):
+        xml = '      <' + tag + ' name="' + obj.name + '">\n'
+        xml += '        <origin xyz="' + vector_to_str(obj.location) + '" rpy="' + \
+               vector_to_str(calc.matrix_to_euler(calc.euler_to_matrix(obj.rotation))) + '"/>\n'
+        xml += '        <geometry>\n'
+        if obj.geometry_type == 'cylinder':
+            xml += '          <cylinder radius="' + to_str(obj.size[0] / 2) + '" length="' + to_str(obj.size[2]) + \
+                   '"/>\n'
+        else:
+            xml += '          <box size="' + vector_to_str(obj.size) + '"/>\n'
+        xml += '        </geometry>\n'
+        if tag == 'visual' and obj.material:
+            xml += '        <material name="' + obj.material.name + '"/>\n'
+        xml += '      </' + tag + '>\n'
+        return xml
+
+    def _link_xml(self, link):
+        xml = '    <link name="' + link.name + '">\n'
+        xml += '      <inertial>\n'
+        xml += '        <origin xyz="0 0 0" rpy="0 0 0"/>\n'
+        xml += '        <mass value="0.001"/>\n'
+        xml += '        <inertia ixx="0.001" ixy="0" ixz="0" iyy="0.001" iyz="0" izz="0.001"/>\n'
+        xml += '      </inertial>\n'
+        for visual in sorted(link.visuals, key=lambda obj: obj.name):
+            xml += self._object_xml(visual, 'visual')
+        for collision in sorted(link.collisions, key=lambda obj: obj.name):
+            xml += self._object_xml(collision, 'collision')
+        xml += '    </link>\n\n'
+        return xml
+
+    def _joint_xml(self, link):
+        return joint_xml(link.name, link.joint_type, vector_to_str(link.location),
+                         vector_to_str(calc.matrix_to_euler(calc.euler_to_matrix(link.rotation))), link.parent.name,
+                         link.axis, link.limits)
+
+    def _material_xml(self, material):
+        xml = '    <material name="' + material.name + '">\n'
+        xml += '      <color rgba="' + vector_to_str(material.diffuse_color) + '"/>\n'
+        xml += '    </material>\n\n'
+        return xml
+
+    def _header(self):
+        return '<?xml version="1.0"?>\n' + PHOBOS_COMMENT + '\n  <robot name="' + self.name + '">\n\n'
+
+    def _sphere_approximation_xml(self, link):
+        xml = '    <link_sphere_approximation link="' + link.name + '">\n'
+        xml += '      <sphere center="0.0 0.0 0.0" radius="0"/>\n'
+        xml += '    </link_sphere_approximation>\n\n'
+        return xml
+
+    def _update_documents(self, urdf_document, srdf_document, links):
+        """(Re-)render the elements of the given links (and their joints and materials)."""
+        for link in links:
+            urdf_document.set_element('link', link.name, self._link_xml(link))
+            if link.parent:
+                urdf_document.set_element('joint', link.name, self._joint_xml(link))
+                srdf_document.set_element('passive_joint', link.name,
+                                          '    <passive_joint name="' + link.name + '"/>\n\n')
+            srdf_document.set_element('link_sphere_approximation', link.name, self._sphere_approximation_xml(link))
+            for visual in link.visuals:
+                if visual.material:
+                    urdf_document.set_element('material', visual.material.name, self._material_xml(visual.material))
+
+    def _new_documents(self):
+        urdf_document = UrdfDocument(self._header(), '  </robot>\n', URDF_TAGS)
+        srdf_document = UrdfDocument(self._header(), '', SRDF_TAGS)
+        self._update_documents(urdf_document, srdf_document, self.base_link.subtree())
+        return urdf_document, srdf_document
+
+    def urdf_string(self):
+        return self._new_documents()[0].to_string()
+
+    def srdf_string(self):
+        return self._new_documents()[1].to_string()
+
+    def export(self, render_images=True, add_mesh_filepath_prefix=True, concave_collision_mesh=False):
+        """Export model to URDF (and SRDF) without Phobos."""
+        if self.documents_outdated:
+            urdf_document, srdf_document = self._new_documents()
+            if self.urdf_document:
+                # remember what has been written before, so only the changes are written again
+                urdf_document.filepath, urdf_document.written = self.urdf_document.filepath, self.urdf_document.written
+                srdf_document.filepath, srdf_document.written = self.srdf_document.filepath, self.srdf_document.written
+            self.urdf_document, self.srdf_document = urdf_document, srdf_document
+            self.documents_outdated = False
+        self.urdf_document.write(self.urdf_path)
+        if self.export_entity_srdf:
+            self.srdf_document.write(self.srdf_path)
+        if self.merge_static_geometry:
+            self.merge_static_links()
+        if self.export_entity_srdf and self.export_collision_matrix:
+            self.write_collision_matrix()
+        if render_images:
+            self.render_images()
@@ -1,11 +1,110 @@
-import bpy
+try:
+    import bpy
+except ImportError:
+    bpy = None  # only UrdfWorld (see urdf_world.py) can be used outside of Blender
 import os
 import sys
+import json
+import tempfile
+from hashlib import sha1
+from subprocess import Popen, DEVNULL
 
 DIR = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(DIR)
 import color
 import calc
+from urdf_document import UrdfDocument, URDF_TAGS, SRDF_TAGS, single
+from collision_matrix import never_colliding_pairs, disable_collisions_xml
+import static_geometry
+if bpy:
+    from mathutils import Matrix
+    from render import render_view
+
+# (blend_filepath, object_name) -> mesh, every mesh is only loaded once per process and survives BlenderWorld.reset()
+_mesh_library = {}
+
+# bpy.data collections that BlenderWorld.purge_orphans() cleans up and memory_stats() counts
+DATA_COLLECTIONS = ("objects", "meshes", "armatures", "cameras", "lights", "materials", "actions", "images",
+                    "textures", "node_groups", "curves", "collections")
+
+# (floor_size, floor_thickness, link_shrink) -> (SceneTemplate, name of the base link, name of the floor, link count)
+# of base link and floor (see BlenderWorld.initialize())
+_templates = {}
+
+# is_cylinder -> (SceneTemplate of link, visual and collision, dimensions of visual and collision) of a fixed link that
+# is copied instead of creating a new one with Phobos (see BlenderWorld._new_fixed_link_directly())
+_fixed_link_prototypes = {}
+
+
+def load_mesh(blend_filepath, object_name):
+    """Return the mesh of the object in the .blend file. Load it from the file only if it is not cached yet."""
+    key = (os.path.abspath(blend_filepath), object_name)
+    if key in _mesh_library:
+        try:
+            _mesh_library[key].name
+            return _mesh_library[key]
+        except ReferenceError:
+            pass  # the mesh has been removed (e.g. bpy.ops.wm.read_homefile())
+    with bpy.data.libraries.load(blend_filepath, link=False) as (data_from, data_to):
+        data_to.objects = [object_name]
+    source = data_to.objects[0]
+    mesh = source.data
+    mesh.use_fake_user = True  # keeps the mesh without users and marks it for reset()
+    bpy.data.objects.remove(source)
+    _mesh_library[key] = mesh
+    return mesh
+
+
+def resident_memory():
+    """Return the resident set size of this process in bytes (the peak if the current size is not available)."""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class SceneTemplate:
+    """
+    Copies of the objects of a scene in a collection that is not linked to any scene. Their data is shared with the
+    restored objects and kept alive by fake users, so it survives BlenderWorld.reset().
+    """
+    def __init__(self, objects):
+        self.collection = bpy.data.collections.new("template")
+        self.collection.use_fake_user = True
+        self.names = [obj.name for obj in objects]
+        self.objects = self._copy(objects, self.collection)
+        for obj in self.objects:
+            if obj.data:
+                obj.data.use_fake_user = True
+
+    @staticmethod
+    def _copy(objects, collection):
+        copies = {obj: obj.copy() for obj in objects}
+        for obj, copy in copies.items():
+            if obj.parent in copies:
+                copy.parent = copies[obj.parent]  # matrix_parent_inverse has been copied already
+            collection.objects.link(copy)
+        return [copies[obj] for obj in objects]
+
+    def is_valid(self):
+        try:
+            self.collection.name
+            return all(obj.name for obj in self.objects)
+        except ReferenceError:
+            return False  # removed with the rest of the file (e.g. bpy.ops.wm.read_homefile())
+
+    def restore(self, collection, rename=None):
+        """
+        Link copies of the template objects into the collection and return them. They get their original names or
+        rename(original name).
+        """
+        objects = self._copy(self.objects, collection)
+        for obj, name in zip(objects, self.names):
+            obj.name = rename(name) if rename else name
+        return objects
 
 
 class BlenderWorld:
@@ -21,44 +120,121 @@ class BlenderWorld:
             self._dir_for_output = config["dir_for_output"]
         self.directory = self._dir_for_output + "/" + self.name
         self.urdf_path = self.directory + "/urdf/" + self.name + ".urdf"
+        self.srdf_path = self.directory + "/srdf/" + self.name + ".srdf"
         self.link_shrink = config["link_shrink"]
         self.export_entity_srdf = config["export_entity_srdf"]
+        if "export_collision_matrix" in config:
+            self.export_collision_matrix = config["export_collision_matrix"]
+        else:
+            self.export_collision_matrix = False
         self.export_mesh_dae = config["export_mesh_dae"]
         self.export_mesh_stl = config["export_mesh_stl"]
         self.output_mesh_type = config["output_mesh_type"]
         self.render_positions = config["render_positions"]
-        bpy.context.scene.render.engine = 'BLENDER_WORKBENCH'
+        if "parallel_render_workers" in config:
+            self.parallel_render_workers = config["parallel_render_workers"]
+        else:
+            self.parallel_render_workers = 0
+        self.render_jobs = []  # (process, snapshot, render_keys_path, render_keys) of the background render workers
+        self.defer_renders = False  # only save render jobs in deferred_renders instead of rendering (e.g. pipeline.py)
+        self.deferred_renders = []  # arguments of render_worker.py (including the snapshot to render)
+        if "merge_static_geometry" in config:
+            self.merge_static_geometry = config["merge_static_geometry"]
+        else:
+            self.merge_static_geometry = False
+        if "direct_data_construction" in config:
+            self.direct_data_construction = config["direct_data_construction"]
+        else:
+            self.direct_data_construction = False
+        if "purge_orphans" in config:
+            self.purge_orphans_on_reset = config["purge_orphans"]
+        else:
+            self.purge_orphans_on_reset = False
+        self.setup_scene()
         self.init_attributes()
+        self.initial_datablocks = self._datablock_keys()  # everything else has been created by this world
+
+    def setup_scene(self):
+        bpy.context.scene.render.engine = 'BLENDER_WORKBENCH'
 
     def init_attributes(self):
         self.base_link = None
         self.floor = None
         self.movable_links = []
+        self.movable_joints = []  # [joint_type, joint_axis, limits] of each movable link
         self.link_offset = (0, 0, 0)
         self.scaling = 1
         self.contains_mesh = False
+        self.meshes = {}  # (blend_filepath, object_name, new_mesh_name) -> working copy of a cached mesh
         self.link_count = 0
         self.img_count = 0
+        self.camera = None
+        # URDF and SRDF of the last export, small changes are applied to them instead of exporting everything again
+        self.urdf_document = None
+        self.srdf_document = None
+        self.documents_outdated = True
+        self.scene_outdated = False  # the depsgraph has not been updated since links have been created directly
 
     def update_name(self, new_name="new_default_name"):
         self.name = new_name
         self.directory = self._dir_for_output + "/" + self.name
         self.urdf_path = self.directory + "/urdf/" + self.name + ".urdf"
+        self.srdf_path = self.directory + "/srdf/" + self.name + ".srdf"
+        self.outdate_documents()
+
+    def outdate_documents(self):
+        """The next export has to export the whole model again."""
+        self.documents_outdated = True
 
     def reset(self):
-        """Select everything and delete it and reset position of 3D cursor. Also remove data for cameras and meshes."""
-        for block in bpy.data.cameras:
-            bpy.data.cameras.remove(block)
-        for block in bpy.data.meshes:
-            bpy.data.meshes.remove(block)
-
-        bpy.ops.object.select_all(action='SELECT')
-        bpy.ops.object.delete(use_global=True)
+        """
+        Remove all objects of the scene and the data that is not used anymore (meshes, armatures, cameras, materials and
+        actions, except the mesh library, the color materials and the templates) directly through bpy.data and reset
+        position of 3D cursor.
+        """
+        bpy.data.batch_remove(list(bpy.context.scene.objects))
+        orphans = [block for blocks in (bpy.data.objects, bpy.data.meshes, bpy.data.armatures, bpy.data.cameras,
+                                        bpy.data.materials, bpy.data.actions)
+                   for block in blocks if block.users == 0]
+        bpy.data.batch_remove(orphans)
+        if self.purge_orphans_on_reset:
+            self.purge_orphans()
         self.init_attributes()
 
         bpy.context.scene.cursor.location = (0, 0, 0)
         bpy.context.scene.cursor.rotation_euler = (0, 0, 0)
 
+    def purge_orphans(self):
+        """
+        Remove all data without users (also data that only became orphaned by removing other orphans) and free the
+        buffers of the remaining images (e.g. the last rendered image). For long-running Blender processes.
+        """
+        while True:
+            orphans = [block for name in DATA_COLLECTIONS for block in getattr(bpy.data, name) if block.users == 0]
+            if not orphans:
+                break
+            bpy.data.batch_remove(orphans)
+        for image in bpy.data.images:
+            if image.has_data:
+                image.buffers_free()
+
+    def _datablock_keys(self):
+        if not bpy:
+            return set()
+        return {(name, block.name) for name in DATA_COLLECTIONS for block in getattr(bpy.data, name)}
+
+    def memory_stats(self):
+        """
+        Return the number of datablocks that are alive, how many of them have been created by this world (since it was
+        initialized) and the resident memory of the process in bytes.
+        """
+        datablocks = self._datablock_keys()
+        return {
+            "datablocks": len(datablocks),
+            "created_datablocks": len(datablocks - self.initial_datablocks),
+            "rss": resident_memory(),
+        }
+
     def subtract_link_shrink(self, x):
         if x < self.link_shrink:
             return x
@@ -67,6 +243,20 @@ class BlenderWorld:
         else:
             return round(x - self.link_shrink, 5)
 
+    def get_mesh(self, mesh):
+        """
+        Return the working copy of a mesh from the mesh library for this world. All links with the same mesh share it.
+        Renaming it (new_mesh_name) does not affect the cached mesh.
+        """
+        new_mesh_name = mesh["new_mesh_name"] if "new_mesh_name" in mesh else None
+        key = (mesh["blend_filepath"], mesh["object_name"], new_mesh_name)
+        if key not in self.meshes:
+            self.meshes[key] = load_mesh(mesh["blend_filepath"], mesh["object_name"]).copy()
+            self.meshes[key].use_fake_user = False
+            if new_mesh_name:
+                self.meshes[key].name = new_mesh_name
+        return self.meshes[key]
+
     def create_visual(self, location=(0, 0, 0), rotation=(0, 0, 0), scale=(1, 1, 1), material=None, name="",
                       parent=None, mesh={}, is_cylinder=False):
         """Create a visual object with the appropriate Phobos object properties. Returns the object."""
@@ -74,25 +264,21 @@ class BlenderWorld:
 
         if mesh:
             self.contains_mesh = True
-
-            blend_filepath = mesh["blend_filepath"]
-            object_name = mesh["object_name"]
-            inner_path = 'Object'
-            bpy.ops.wm.append(filepath=os.path.join(blend_filepath, inner_path, object_name),
-                              directory=os.path.join(blend_filepath, inner_path), filename=object_name)
-            # Source:
-            # https://b3d.interplanety.org/en/how-to-append-an-object-from-another-blend-file-to-the-scene-using-the-blender-python-api/
-
-            visual = bpy.context.selected_objects[0]  # bpy.ops.wm.append() selects the new object
+            mesh_data = self.get_mesh(mesh)
+            visual = bpy.data.objects.new(mesh["object_name"], mesh_data)
+            bpy.context.collection.objects.link(visual)
+            bpy.ops.object.select_all(action='DESELECT')
+            visual.select_set(True)
             bpy.context.view_layer.objects.active = visual
             visual.location = location
             visual.rotation_euler = rotation
-            visual.scale = scale
-            bpy.ops.object.transform_apply(location=False, rotation=False, scale=True)
-            if "new_mesh_name" in mesh:
-                new_mesh_name = mesh["new_mesh_name"]
-                if new_mesh_name:
-                    visual.data.name = new_mesh_name
+            visual.scale = scale  # not applied to the mesh because the mesh is shared with other links
+            if material:
+                # assign the material to the object instead of the shared mesh
+                if not visual.material_slots:
+                    mesh_data.materials.append(None)
+                for slot in visual.material_slots:
+                    slot.link = 'OBJECT'
         elif is_cylinder:
             bpy.ops.mesh.primitive_cylinder_add(location=location, rotation=rotation, scale=tuple(x / 2 for x in scale))
             visual = bpy.context.active_object
@@ -145,10 +331,24 @@ class BlenderWorld:
                                        material=color.LAVENDER, name="floor")
 
     def initialize(self, floor_size=32, floor_thickness=0.2):
-        """Reset world, create base link and floor."""
+        """
+        Reset world, create base link and floor. They are only created with Phobos the first time, afterwards they are
+        copied from a template.
+        """
         self.reset()
+        key = (floor_size, floor_thickness, self.link_shrink)
+        if key in _templates and _templates[key][0].is_valid():
+            template, base_link_name, floor_name, link_count = _templates[key]
+            objects = dict(zip(template.names, template.restore(bpy.context.collection)))
+            self.base_link = objects[base_link_name]
+            self.floor = objects[floor_name] if floor_name else None
+            self.link_count = link_count
+            bpy.context.view_layer.update()
+            return
         self.create_base_link()
         self.create_floor(floor_size, floor_thickness)
+        _templates[key] = (SceneTemplate(list(bpy.context.scene.objects)), self.base_link.name,
+                           self.floor.name if self.floor else None, self.link_count)
 
     def update_joint_axis(self, link, direction_vector=(1, 0, 0)):
         """
@@ -163,10 +363,13 @@ class BlenderWorld:
         bone.tail = direction_vector
         bpy.ops.object.mode_set(mode='OBJECT')
 
+    def is_fixed(self, link):
+        return link.values()[1] == 'fixed'
+
     def _rename_links_recursively(self, link, link_number, joint_number):
         if not link or not link.parent or link.name == 'base_link':  # exit condition
             return
-        if not link.values()[1] == 'fixed':
+        if not self.is_fixed(link):
             new_name = "link_" + str(link_number) + "_joint_" + str(joint_number)
             if link.parent.name == new_name:
                 link.parent.name = "link_" + str(link_number) + "_joint_" + str(joint_number + 1)
@@ -188,6 +391,7 @@ class BlenderWorld:
     def new_link(self, location, rotation, scale, joint_type='fixed', limits=(0, 0), material=None, auto_limit=0,
                  mesh={}, is_cylinder=False, name="", parent=None, create_handle=False, collision=True,
                  joint_axis=(0, 0, 1), hinge_diameter=0):
+        self.outdate_documents()
         # apply global offset and scaling
         if not parent:
             location = calc.tuple_add(location, self.link_offset)
@@ -218,18 +422,23 @@ class BlenderWorld:
         else:
             name = str(self.link_count) + "_link_" + str(link_number)
         self.link_count += 1
-        visual = self.create_visual(location, rotation, modified_scale, material, name, parent, mesh, is_cylinder)
-        if joint_type != 'fixed':
-            self._rename_links_recursively(parent, link_number, joint_number=1)
-            name = str(link_number) + "_joint_0"
-        self.create_link_and_joint(visual, name, joint_type, limits)
-        link = visual.parent
-        if scale == (0, 0, 0):
-            self.apply_to_subtree(link, remove_visual=True)
-        elif collision:
-            self.create_collision(visual)
+        if self.direct_data_construction and joint_type == 'fixed' and not mesh and scale != (0, 0, 0):
+            link = self._new_fixed_link_directly(location, rotation, modified_scale, material, name, parent,
+                                                 is_cylinder, collision)
+        else:
+            visual = self.create_visual(location, rotation, modified_scale, material, name, parent, mesh, is_cylinder)
+            if joint_type != 'fixed':
+                self._rename_links_recursively(parent, link_number, joint_number=1)
+                name = str(link_number) + "_joint_0"
+            self.create_link_and_joint(visual, name, joint_type, limits)
+            link = visual.parent
+            if scale == (0, 0, 0):
+                self.apply_to_subtree(link, remove_visual=True)
+            elif collision:
+                self.create_collision(visual)
         if joint_type != 'fixed' and parent == self.base_link:
             self.movable_links.append(link)
+            self.movable_joints.append([joint_type, joint_axis, single(limits)])
         if joint_axis != (0, 0, 1):
             # do this (update joint axis) before adding child links e.g. hinge or handle
             self.update_joint_axis(link, joint_axis)
@@ -244,6 +453,58 @@ class BlenderWorld:
             self._create_handle_automatically(link, collision, rotation, scale, joint_type)
         return link
 
+    def _fixed_link_prototype(self, is_cylinder):
+        """
+        Return the template of a fixed link (link, visual and collision) that has been created with Phobos once and the
+        dimensions of its visual and collision. The template is not part of the scene.
+        """
+        if is_cylinder in _fixed_link_prototypes and _fixed_link_prototypes[is_cylinder][0].is_valid():
+            return _fixed_link_prototypes[is_cylinder]
+        visual = self.create_visual(name="prototype", is_cylinder=is_cylinder)
+        # the copies share the mesh, so their materials are assigned to the objects instead of the mesh
+        visual.data.materials.append(None)
+        visual.material_slots[0].link = 'OBJECT'
+        self.create_link_and_joint(visual, "prototype", 'fixed')
+        link = visual.parent
+        collision = self.create_collision(visual)
+        bpy.context.view_layer.update()
+        objects = [link, visual, collision]
+        prototype = SceneTemplate(objects), tuple(visual.dimensions), tuple(collision.dimensions)
+        bpy.data.batch_remove(objects)
+        _fixed_link_prototypes[is_cylinder] = prototype
+        return prototype
+
+    def _new_fixed_link_directly(self, location, rotation, scale, material, name, parent, is_cylinder, collision):
+        """
+        Create a fixed link like create_visual(), create_link_and_joint() and create_collision() but without any
+        operator: the objects of a prototype are copied through bpy.data (with the Phobos properties), placed and
+        scaled. The depsgraph is only updated once before the next export or rendering. Returns the link.
+        """
+        self.outdate_documents()
+        template, visual_dimensions, collision_dimensions = self._fixed_link_prototype(is_cylinder)
+        link, visual, collision_obj = template.restore(bpy.context.collection,
+                                                       rename=lambda prototype: prototype.replace("prototype", name))
+        scale = tuple(map(self.subtract_link_shrink, scale))
+        # like create_visual(): the pose is relative to the parent (without parent inverse)
+        link.parent = parent
+        link.matrix_parent_inverse = Matrix.Identity(4)
+        link.location = location
+        link.rotation_euler = rotation
+        for obj, dimensions in ((visual, visual_dimensions), (collision_obj, collision_dimensions)):
+            obj.scale = tuple(s * x / d for s, x, d in zip(obj.scale, scale, dimensions))
+        if material:
+            visual.active_material = material
+        if not collision:
+            bpy.data.objects.remove(collision_obj)
+        self.scene_outdated = True
+        return link
+
+    def update_scene(self):
+        """Update the depsgraph once after links have been created directly (see _new_fixed_link_directly())."""
+        if self.scene_outdated:
+            bpy.context.view_layer.update()
+            self.scene_outdated = False
+
     def new_link_2d_plus_rotation(self, location, rotation, scale, x_limits=(-1, 1), y_limits=(-1, 1),
                                   revolute_limits=(-calc.RAD180, calc.RAD180), material=None, mesh={},
                                   is_cylinder=False, parent=None, create_handle=False, collision=True,
@@ -308,14 +569,30 @@ class BlenderWorld:
         object.select_set(True)
 
     def duplicate_with_children(self, object):
+        self.outdate_documents()
         self.select_with_children(object)
         bpy.ops.object.duplicate()
         return bpy.context.active_object
 
+    def remove_from_documents(self, link_names):
+        """Remove links (and their joints) from URDF and SRDF of the last export."""
+        if self.documents_outdated:
+            return
+        for name in link_names:
+            for tag in URDF_TAGS[:2]:
+                self.urdf_document.remove_element(tag, name)
+            if self.srdf_document:
+                for tag in SRDF_TAGS:
+                    self.srdf_document.remove_element(tag, name)
+        self.urdf_document.remove_unused_materials()
+
     def remove_last_object(self):
         self.select_with_children(self.movable_links[-1])
+        link_names = [obj.name for obj in bpy.context.selected_objects if obj.phobostype == 'link']
         bpy.ops.object.delete()
         self.movable_links.pop()
+        self.movable_joints.pop()
+        self.remove_from_documents(link_names)
 
     def set_limit_of_latest_link(self, limit, is_prismatic):
         """
@@ -330,6 +607,13 @@ class BlenderWorld:
                 self.movable_links[-1].pose.bones["Bone"].constraints["Limit Rotation"].min_x = limit
             else:
                 self.movable_links[-1].pose.bones["Bone"].constraints["Limit Rotation"].max_x = limit
+        joint = self.movable_joints[-1]
+        if not is_prismatic and limit < 0:
+            joint[2] = single((limit, joint[2][1]))
+        else:
+            joint[2] = single((joint[2][0], limit))
+        if not self.documents_outdated:
+            self.urdf_document.update_joint(self.movable_links[-1].name, *joint)
 
     def zeroize_limits(self, link):
         link.pose.bones["Bone"].constraints["Limit Location"].min_x = 0
@@ -352,6 +636,7 @@ class BlenderWorld:
 
     def create_collision(self, visual_obj=None):
         """Create collision objects from visual objects."""
+        self.outdate_documents()
         if visual_obj:
             bpy.ops.object.select_all(action='DESELECT')
             visual_obj.select_set(True)
@@ -366,6 +651,7 @@ class BlenderWorld:
 
     def apply_to_subtree(self, object, new_material=None, remove_visual=False, remove_collision=False,
                          zeroize_limits=False):
+        self.outdate_documents()
         self.select_with_children(object)
         for obj in bpy.context.selected_objects:
             if obj.phobostype == 'visual':
@@ -399,33 +685,165 @@ class BlenderWorld:
         goal_duplicate.name = "goal"
         return goal_duplicate
 
-    def render_image(self, location=(30, 0, 20), rotation=(0.96, 0, calc.RAD90), focal_length=90):
-        bpy.ops.object.camera_add(location=location, rotation=rotation)
-        cam = bpy.context.object
-        cam.data.lens = focal_length + 10
-        bpy.context.scene.camera = cam
-
-        bpy.ops.object.select_all(action='SELECT')
-        if self.floor:
-            self.floor.select_set(False)
-            for child in self.floor.children:
-                if child.phobostype == 'collision' or child.phobostype == 'visual':
-                    child.select_set(False)
-        bpy.ops.view3d.camera_to_view_selected()
-
-        cam.data.lens = focal_length
+    def _next_image_filepath(self):
         filepath = self.directory + "/images/" + self.name + "_img_" + f"{self.img_count:02}" + ".png"
-        bpy.context.scene.render.filepath = filepath
-        bpy.ops.render.render(write_still=True)
         self.img_count += 1
-        return cam
+        return filepath
+
+    def _excluded_from_view(self):
+        """The floor is not taken into account when zooming in on the puzzle."""
+        if not self.floor:
+            return []
+        return [self.floor.name] + [child.name for child in self.floor.children
+                                    if child.phobostype == 'collision' or child.phobostype == 'visual']
+
+    def render_image(self, location=(30, 0, 20), rotation=(0.96, 0, calc.RAD90), focal_length=90):
+        self.camera = render_view(self._next_image_filepath(), location, rotation, focal_length, self.camera,
+                                  self._excluded_from_view())
+        return self.camera
+
+    def _render_keys_path(self):
+        return self.directory + "/images/render_keys.json"
+
+    def _read_render_keys(self, path):
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _write_render_keys(self, path, render_keys):
+        keys = self._read_render_keys(path)
+        keys.update(render_keys)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(keys, f, indent=1)
+
+    def render_images(self, focal_length=90):
+        """
+        Render an image for every render position.
+        Images that already exist for the same URDF content and camera pose are not rendered again.
+        If parallel_render_workers is set, the images are rendered in background Blender processes from a snapshot
+        of the scene and generation can go on in the meantime (see wait_for_renders()).
+        """
+        self.update_scene()
+        content_hash = None
+        if os.path.exists(self.urdf_path):
+            with open(self.urdf_path, 'rb') as f:
+                content_hash = sha1(f.read()).hexdigest()
+        existing_keys = self._read_render_keys(self._render_keys_path())
+        views = []
+        render_keys = {}
+        for location, rotation in self.render_positions:
+            filepath = self._next_image_filepath()
+            key = sha1(repr((content_hash, tuple(location), tuple(rotation), focal_length)).encode()).hexdigest()
+            filename = os.path.basename(filepath)
+            if content_hash and existing_keys.get(filename) == key and os.path.exists(filepath):
+                continue
+            views.append((filepath, tuple(location), tuple(rotation)))
+            if content_hash:
+                render_keys[filename] = key
+        if not views:
+            return
+
+        if self.defer_renders:
+            file_descriptor, snapshot = tempfile.mkstemp(prefix=self.name + "_", suffix=".blend")
+            os.close(file_descriptor)
+            bpy.ops.wm.save_as_mainfile(filepath=snapshot, copy=True)
+            self.deferred_renders.append({"snapshot": snapshot, "views": views, "focal_length": focal_length,
+                                          "excluded_objects": self._excluded_from_view(),
+                                          "render_keys_path": self._render_keys_path(), "render_keys": render_keys})
+            return
+
+        if not self.parallel_render_workers:
+            for filepath, location, rotation in views:
+                self.camera = render_view(filepath, location, rotation, focal_length, self.camera,
+                                          self._excluded_from_view())
+            self._write_render_keys(self._render_keys_path(), render_keys)
+            return
+
+        file_descriptor, snapshot = tempfile.mkstemp(prefix=self.name + "_", suffix=".blend")
+        os.close(file_descriptor)
+        bpy.ops.wm.save_as_mainfile(filepath=snapshot, copy=True)
+        for i in range(min(self.parallel_render_workers, len(views))):
+            chunk = views[i::self.parallel_render_workers]
+            args = {"views": chunk, "focal_length": focal_length, "excluded_objects": self._excluded_from_view()}
+            chunk_keys = {os.path.basename(view[0]): render_keys[os.path.basename(view[0])]
+                          for view in chunk if os.path.basename(view[0]) in render_keys}
+            self.wait_for_renders(self.parallel_render_workers - 1)
+            process = Popen([bpy.app.binary_path, "-b", snapshot, "-P", DIR + "/render_worker.py", "--",
+                             json.dumps(args)], stdout=DEVNULL)
+            self.render_jobs.append((process, snapshot, self._render_keys_path(), chunk_keys))
+
+    def wait_for_renders(self, max_running_jobs=0):
+        """Wait until at most max_running_jobs background render workers are still running."""
+        while len(self.render_jobs) > max_running_jobs:
+            process, snapshot, render_keys_path, render_keys = self.render_jobs.pop(0)
+            if process.wait() == 0:
+                self._write_render_keys(render_keys_path, render_keys)
+            else:
+                print("render worker failed to render", list(render_keys) or snapshot)
+            if all(job[1] != snapshot for job in self.render_jobs):
+                os.remove(snapshot)
 
-    def render_images(self):
-        for loc_rot in self.render_positions:
-            self.render_image(loc_rot[0], loc_rot[1])
+    def write_documents(self):
+        """Write URDF and SRDF of the last export including the changes that have been applied to them since."""
+        self.urdf_document.write(self.urdf_path)
+        if self.srdf_document:
+            self.srdf_document.write(self.srdf_path)
+
+    def write_collision_matrix(self):
+        """
+        Add the link pairs that can never collide within the joint limits to the SRDF (as <disable_collisions>
+        elements, see collision_matrix.py). The URDF must have been exported already.
+        """
+        document = self.srdf_document
+        if document is None or self.merge_static_geometry:
+            # exported with meshes (the SRDF of Phobos has not been read) or the file differs from the document
+            document = UrdfDocument.read(self.srdf_path, SRDF_TAGS)
+        document.elements['disable_collisions'] = {}
+        for link1, link2 in never_colliding_pairs(self.urdf_path):
+            document.set_element('disable_collisions', link1 + " " + link2, disable_collisions_xml(link1, link2))
+        document.write(self.srdf_path)
+        if self.srdf_document is not None:
+            self.srdf_document.written = document.written
+
+    def merge_static_links(self):
+        """
+        Rewrite URDF (and SRDF) with the static links whose boxes fuse merged into one link per fused box (see
+        static_geometry.py). The documents of the last export are not merged, so they can still be patched, they only
+        learn what has been written.
+        """
+        urdf_document = UrdfDocument.read(self.urdf_path, URDF_TAGS)
+        srdf_document = UrdfDocument.read(self.srdf_path, SRDF_TAGS) if self.export_entity_srdf else None
+        # walls and pillars that touch each other are link_shrink apart
+        static_geometry.merge_static_geometry(urdf_document, srdf_document, gap=self.link_shrink + 1e-4)
+        urdf_document.write(self.urdf_path)
+        if self.urdf_document is not None:
+            self.urdf_document.written = urdf_document.written
+        if srdf_document is not None:
+            srdf_document.write(self.srdf_path)
+            if self.srdf_document is not None:
+                self.srdf_document.written = srdf_document.written
 
     def export(self, render_images=True, add_mesh_filepath_prefix=True, concave_collision_mesh=False):
-        """Export model to URDF."""
+        """
+        Export model to URDF.
+        If only limits have been changed or links have been removed since the last export, the URDF (and SRDF) of the
+        last export is patched instead of exporting everything again with Phobos.
+        """
+        if self.documents_outdated or self.contains_mesh:
+            self.export_with_phobos(add_mesh_filepath_prefix, concave_collision_mesh)
+        else:
+            self.write_documents()
+        if self.merge_static_geometry:
+            self.merge_static_links()
+        if self.export_entity_srdf and self.export_collision_matrix:
+            self.write_collision_matrix()
+        if render_images:
+            self.render_images()
+
+    def export_with_phobos(self, add_mesh_filepath_prefix=True, concave_collision_mesh=False):
+        self.update_scene()
         bpy.context.scene.phobosexportsettings.path = self.directory
         bpy.context.scene.phobosexportsettings.selectedOnly = False
         bpy.context.scene.export_entity_urdf = True
@@ -444,8 +862,13 @@ class BlenderWorld:
         bpy.ops.phobos.export_model()
         if self.contains_mesh:
             self.modify_urdf(add_mesh_filepath_prefix, concave_collision_mesh)
-        if render_images:
-            self.render_images()
+        else:
+            self.urdf_document = UrdfDocument.read(self.urdf_path, URDF_TAGS)
+            if self.export_entity_srdf:
+                self.srdf_document = UrdfDocument.read(self.srdf_path, SRDF_TAGS)
+            else:
+                self.srdf_document = None
+            self.documents_outdated = False
 
     def modify_urdf(self, add_mesh_filepath_prefix=True, concave_collision_mesh=False):
         """